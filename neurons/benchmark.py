@@ -0,0 +1,305 @@
+"""
+Benchmarks of the miner's processing stages on the bundled test images.
+
+    python neurons/benchmark.py preprocess [--images_dir DIR] [--repeat N]
+    python neurons/benchmark.py tesseract [--images_dir DIR] [--min_relative_accuracy R] [--output FILE]
+    python neurons/benchmark.py association [--lines N] [--checkboxes N]
+
+Latencies are medians over `--repeat` runs per image.
+
+preprocess scores the fuzzy token similarity (0-100) of the recognised text against the `<image>.txt`
+label next to the image when there is one, and against the OCR of the unprocessed image otherwise.
+
+tesseract runs the whole pipeline for every Tesseract configuration and scores the selected checkboxes
+with the validator's accuracy_score_calculation against the `<image>.json` label next to the image
+(a list of {"checkbox_boundingBox": [...], "text": ...}), or against the output of Tesseract's default
+configuration when there is none. The fastest configuration scoring at least `--min_relative_accuracy`
+times the default configuration's score is written to `--output`, to be passed to the miner with
+`--ocr.config_file`.
+
+association times checkbox-to-text association on a synthetic form and checks that the indexed
+loop, the numpy matrix engine and the column-aware engine (the form's labels are all on the right)
+return exactly what the full scan of the lines does.
+"""
+import os
+import glob
+import json
+import time
+import copy
+import base64
+import random
+import asyncio
+import argparse
+import itertools
+import statistics
+
+from fuzzywuzzy import fuzz
+
+from template.validator.reward import accuracy_score_calculation
+
+from image import decode_image
+from ocr import ocr_image_with_custom_line_detection
+from ocr_engine import TesseractPool
+from document import OcrDocument
+from geometry import polygons_to_xyxy
+from preprocess import PROFILES
+from postprocessor import YoloCheckboxDetector, AssociationContext
+from detector import HttpCheckboxDetector, OnnxCheckboxDetector
+
+TEST_IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_images")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+# Characters found in form labels, everything else is most likely noise around the checkboxes
+CHARACTER_WHITELIST = (
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,:;!?'\"()[]/&%$#@+-_*"
+)
+
+
+def tesseract_configs():
+    """
+    Returns the Tesseract configurations compared by the tesseract benchmark: every combination of
+    page segmentation mode, engine mode (default, legacy, LSTM only), dictionary and character whitelist.
+    """
+    configs = []
+    for psm, oem, dictionary, whitelist in itertools.product((None, 4, 6, 11), (None, 0, 1), (True, False), (False, True)):
+        variables = {}
+        if not dictionary:
+            variables.update({"load_system_dawg": 0, "load_freq_dawg": 0})
+        if whitelist:
+            variables["tessedit_char_whitelist"] = CHARACTER_WHITELIST
+        configs.append({"psm": psm, "oem": oem, "variables": variables})
+    return configs
+
+
+def describe_config(config):
+    parts = [f"psm={config['psm'] if config['psm'] is not None else 'default'}",
+             f"oem={config['oem'] if config['oem'] is not None else 'default'}"]
+    if "load_system_dawg" in config["variables"]:
+        parts.append("no-dict")
+    if "tessedit_char_whitelist" in config["variables"]:
+        parts.append("whitelist")
+    return " ".join(parts)
+
+
+def load_images(directories):
+    """Returns (path, DecodedImage) for every image found in the given directories."""
+    images = []
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, "*"))):
+            if path.lower().endswith(IMAGE_EXTENSIONS):
+                with open(path, "rb") as image_file:
+                    images.append((path, decode_image(base64.b64encode(image_file.read()).decode("utf-8"))))
+    return images
+
+
+def load_label(path, extension=".txt"):
+    """Returns the label stored next to an image (text, or parsed JSON for `.json`), or None."""
+    label_path = os.path.splitext(path)[0] + extension
+    if not os.path.exists(label_path):
+        return None
+    with open(label_path) as label_file:
+        return json.load(label_file) if extension == ".json" else label_file.read()
+
+
+def ocr_text(ocr_result):
+    return " ".join(ocr_result.line_texts())
+
+
+def timed(fn, repeat):
+    """Runs fn `repeat` times and returns its last result and the median latency in seconds."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return result, statistics.median(latencies)
+
+
+def print_table(header, rows):
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+
+def benchmark_preprocess(args):
+    images = load_images([args.images_dir])
+    references = {}
+    for path, image in images:
+        label = load_label(path)
+        references[path] = label if label is not None else ocr_text(ocr_image_with_custom_line_detection(image))
+
+    rows = []
+    for profile in PROFILES:
+        latencies, scores = [], []
+        for path, image in images:
+            result, latency = timed(lambda: ocr_image_with_custom_line_detection(image, profile=profile), args.repeat)
+            latencies.append(latency)
+            scores.append(fuzz.token_sort_ratio(ocr_text(result), references[path]))
+        rows.append((
+            profile,
+            f"{statistics.mean(latencies) * 1000:.0f}",
+            f"{statistics.mean(scores):.1f}",
+            f"{min(scores)}",
+        ))
+    print_table(("profile", "latency_ms", "accuracy", "worst"), rows)
+
+
+def detect_checkboxes(args, images):
+    """Runs the checkbox detector once per image, its output doesn't depend on the Tesseract configuration."""
+    if args.model_path:
+        detector = OnnxCheckboxDetector(args.model_path)
+    else:
+        detector = HttpCheckboxDetector(args.yolo_endpoint)
+
+    async def run():
+        try:
+            return [await detector.predict(image, os.path.basename(path)) for path, image in images]
+        finally:
+            await detector.close()
+
+    return asyncio.run(run())
+
+
+def run_pipeline(image, engine, postprocessor, predictions, request_id):
+    ocr_data = ocr_image_with_custom_line_detection(image, engine=engine)
+    return postprocessor.get_selected_checkboxes_with_text(predictions, ocr_data, request_id)
+
+
+def benchmark_tesseract(args):
+    images = load_images([TEST_IMAGES_DIR] + ([args.images_dir] if args.images_dir else []))
+    predictions = detect_checkboxes(args, images)
+
+    postprocessor = YoloCheckboxDetector()
+    configs = tesseract_configs()
+    rows, results = [], []
+    labels = {}
+    for config in configs:
+        engine = TesseractPool(num_workers=1, lang=args.lang, **config)
+        try:
+            engine.warmup()
+            latencies, scores = [], []
+            for (path, image), image_predictions in zip(images, predictions):
+                request_id = os.path.basename(path)
+                checkboxes, latency = timed(lambda: run_pipeline(image, engine, postprocessor, image_predictions, request_id), args.repeat)
+                if path not in labels:
+                    # The first configuration is Tesseract's default, it stands in for missing labels
+                    label = load_label(path, ".json")
+                    labels[path] = label if label is not None else checkboxes
+                latencies.append(latency)
+                scores.append(accuracy_score_calculation(checkboxes, labels[path]))
+        except Exception as e:
+            # e.g. the legacy engine isn't available with the installed traineddata
+            rows.append((describe_config(config), "-", "-", f"failed: {e}"))
+            continue
+        finally:
+            engine.shutdown(wait=True)
+        latency, accuracy = statistics.mean(latencies), statistics.mean(scores)
+        results.append((latency, accuracy, config))
+        rows.append((describe_config(config), f"{latency * 1000:.0f}", f"{accuracy:.3f}", ""))
+    print_table(("config", "latency_ms", "accuracy", ""), rows)
+
+    # accuracy_score_calculation averages over every detected/label pair, so even a perfect answer scores
+    # below 1 on pages with several checkboxes: the floor is relative to Tesseract's default configuration
+    baseline = next((accuracy for _, accuracy, config in results if config == configs[0]), None)
+    if baseline is None:
+        print("Tesseract's default configuration failed, nothing written")
+        return
+    floor = baseline * args.min_relative_accuracy
+    eligible = [result for result in results if result[1] >= floor]
+    latency, accuracy, config = min(eligible, key=lambda result: result[0])
+    with open(args.output, "w") as output_file:
+        json.dump(config, output_file, indent=4)
+    print(f"Fastest configuration above {floor:.3f}: {describe_config(config)} "
+          f"({latency * 1000:.0f} ms, accuracy {accuracy:.3f})")
+    print(f"Written to {args.output}, start the miner with --ocr.config_file {os.path.abspath(args.output)}")
+
+
+def synthetic_form(num_lines, num_checkboxes, columns=3, seed=0):
+    """
+    Returns an OcrDocument with `num_lines` label lines laid out in columns and `num_checkboxes` selected
+    checkbox predictions placed left of randomly chosen lines.
+    """
+    rng = random.Random(seed)
+    ocr_data = {key: [] for key in ("text", "left", "top", "width", "height", "block_num", "par_num", "line_num")}
+    rows = -(-num_lines // columns)
+    starts = []
+    for line in range(num_lines):
+        column, row = divmod(line, rows)
+        x, y = 100 + column * 800 + 40, 100 + row * 36
+        starts.append((x, y))
+        for word in range(rng.randint(1, 5)):
+            width = rng.randint(20, 90)
+            values = ("word", x, y + rng.randint(0, 2), width, 20, column + 1, 1, row + 1)
+            for key, value in zip(ocr_data, values):
+                ocr_data[key].append(value)
+            x += width + 12
+    document = OcrDocument.from_ocr_data(ocr_data, 100 + columns * 800, 100 + rows * 36 + 100)
+
+    predictions = []
+    for x, y in rng.sample(starts, min(num_checkboxes, num_lines)):
+        x1, y1 = x - 35, y + rng.randint(-3, 3)
+        predictions.append({
+            "state": "selected", "confidence": 0.9,
+            "boundingBox": [x1, y1, x1 + 22, y1, x1 + 22, y1 + 22, x1, y1 + 22],
+        })
+    return document, predictions
+
+
+def benchmark_association(args):
+    document, predictions = synthetic_form(args.lines, args.checkboxes)
+    detector = YoloCheckboxDetector(multiline=args.multiline)
+    # Every detection, for add_continuation_lines to tell other checkboxes' labels apart
+    checkbox_boxes = polygons_to_xyxy([checkbox["boundingBox"] for checkbox in predictions])
+
+    engines = {
+        "scan": lambda context, checkboxes: detector.get_associated_text(context, checkboxes, use_index=False),
+        "index": detector.get_associated_text,
+        "matrix": detector.get_associated_text_matrix,
+        "columns": detector.get_associated_text_columns,
+    }
+    rows, outputs = [], {}
+    for name, engine in engines.items():
+        outputs[name], latency = timed(
+            lambda: engine(AssociationContext(document, "", checkbox_boxes), copy.deepcopy(predictions)), args.repeat
+        )
+        rows.append((name, f"{latency * 1000:.2f}", len(outputs[name]), outputs[name] == outputs["scan"]))
+    print_table(("engine", "latency_ms", "associated", "identical_to_scan"), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    preprocess_parser = subparsers.add_parser("preprocess", help="Compare the OCR preprocessing profiles.")
+    preprocess_parser.add_argument("--images_dir", type=str, default=TEST_IMAGES_DIR, help="Folder of images to OCR.")
+    preprocess_parser.add_argument("--repeat", type=int, default=3, help="Runs per image and profile.")
+    preprocess_parser.set_defaults(run=benchmark_preprocess)
+
+    tesseract_parser = subparsers.add_parser(
+        "tesseract", help="Compare Tesseract configurations and save the fastest accurate one for the miner."
+    )
+    tesseract_parser.add_argument("--images_dir", type=str, default="", help="Folder of images used besides test_images.")
+    tesseract_parser.add_argument("--repeat", type=int, default=3, help="Runs per image and configuration.")
+    tesseract_parser.add_argument("--lang", type=str, default="eng", help="Tesseract language(s).")
+    tesseract_parser.add_argument(
+        "--min_relative_accuracy", type=float, default=0.98,
+        help="Lowest acceptable accuracy, as a fraction of the default configuration's.",
+    )
+    tesseract_parser.add_argument("--output", type=str, default="tesseract_config.json", help="File the chosen configuration is written to.")
+    tesseract_parser.add_argument("--yolo_endpoint", type=str, default="http://127.0.0.1:5000/predict", help="URL of the YOLO service.")
+    tesseract_parser.add_argument("--model_path", type=str, default="", help="ONNX checkbox model, used instead of the YOLO service when set.")
+    tesseract_parser.set_defaults(run=benchmark_tesseract)
+
+    association_parser = subparsers.add_parser("association", help="Time checkbox-to-text association.")
+    association_parser.add_argument("--lines", type=int, default=600, help="Text lines on the synthetic form.")
+    association_parser.add_argument("--checkboxes", type=int, default=300, help="Selected checkboxes on the form.")
+    association_parser.add_argument("--repeat", type=int, default=5, help="Runs per engine.")
+    association_parser.add_argument("--multiline", action="store_true", help="Assemble labels wrapped over several lines.")
+    association_parser.set_defaults(run=benchmark_association)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+import aiohttp
+import numpy as np
+import bittensor as bt
+
+from geometry import non_max_suppression
+
+
+class DetectorError(RuntimeError):
+    """Raised when the checkbox detector could not produce predictions for an image."""
+
+
+class CheckboxDetector(ABC):
+    """
+    Interface of the checkbox detection backends used by the miner.
+
+    Backends take the request's image.DecodedImage and return a list of predictions in the format
+    consumed by YoloCheckboxDetector.get_selected_checkboxes: one dict per checkbox with a `state`
+    ("selected" or "unselected"), a `confidence` and a `boundingBox` (or `polygon`) of the form
+    [x1, y1, x2, y1, x2, y2, x1, y2] in page pixels.
+    """
+
+    @abstractmethod
+    async def predict(self, image, request_id, timeout=None):
+        """
+        Returns the predictions for one image.
+
+        Raises:
+            DetectorError: If no predictions could be produced.
+        """
+
+    async def predict_batch(self, images, request_ids, timeout=None):
+        """
+        Returns one list of predictions per image, or a DetectorError instance for images that failed.
+        Backends that can run several images at once override this.
+        """
+        return await asyncio.gather(
+            *[self.predict(image, request_id, timeout) for image, request_id in zip(images, request_ids)],
+            return_exceptions=True,
+        )
+
+    async def close(self):
+        pass
+
+    def shutdown(self):
+        """Releases the backend's resources when the miner exits."""
+
+
+class HttpCheckboxDetector(CheckboxDetector):
+    """
+    Async client for the YOLO checkbox service.
+
+    One aiohttp session, and with it a pool of keep-alive connections, is shared by every request
+    the miner makes. Each call gets a deadline that covers all of its attempts, and failed attempts
+    are retried a bounded number of times with exponential backoff.
+    """
+
+    def __init__(self, endpoint, timeout=10.0, max_retries=2, pool_size=16, keepalive_timeout=60.0, backoff=0.1,
+                 batch_endpoint=None):
+        self.endpoint = endpoint
+        self.batch_endpoint = batch_endpoint
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.backoff = backoff
+        self._session = None
+        self._loop = None
+
+    def _get_session(self):
+        # aiohttp sessions are bound to the loop they were created on, so a new one is opened
+        # if the detector is used from another loop (e.g. a warm-up run before the axon starts).
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = loop
+        return self._session
+
+    async def predict(self, image, request_id, timeout=None):
+        """
+        Sends the image to the service and returns its list of predictions.
+
+        The service takes base64, so the string received from the validator is passed through as is.
+
+        Raises:
+            DetectorError: If every attempt failed or the deadline passed.
+        """
+        return await self._post(self.endpoint, {"image": image.encoded, "request_id": request_id}, request_id, timeout)
+
+    async def predict_batch(self, images, request_ids, timeout=None):
+        """
+        Runs detection for several images and returns one list of predictions per image.
+
+        With a `batch_endpoint`, all images go to the service in a single request of the form
+        `{"images": [{"image": ..., "request_id": ...}, ...]}`, answered with `{"predictions": [[...], ...]}`.
+        Without one, the images are sent concurrently as single requests over the pooled connections.
+        Entries for images that failed are DetectorError instances rather than lists.
+        """
+        if not self.batch_endpoint:
+            return await super().predict_batch(images, request_ids, timeout)
+        batch_id = ",".join(request_ids)
+        payload = {
+            "images": [{"image": image.encoded, "request_id": request_id} for image, request_id in zip(images, request_ids)]
+        }
+        try:
+            predictions = await self._post(self.batch_endpoint, payload, batch_id, timeout)
+        except DetectorError as e:
+            return [e] * len(images)
+        if len(predictions) != len(images):
+            return [DetectorError(f"YOLO batch {batch_id} returned {len(predictions)} results for {len(images)} images")] * len(images)
+        return predictions
+
+    async def _post(self, endpoint, payload, request_id, timeout=None):
+        """
+        Posts a payload to the service and returns the `predictions` of its response.
+
+        Args:
+            endpoint (str): URL to post to.
+            payload (dict): JSON body of the request.
+            request_id (str): Identifier used in logs and errors.
+            timeout (float): Deadline in seconds for the whole call, retries included. Defaults to self.timeout.
+
+        Raises:
+            DetectorError: If every attempt failed or the deadline passed.
+        """
+        session = self._get_session()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout if timeout is not None else self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                async with session.post(
+                    endpoint, json=payload, timeout=aiohttp.ClientTimeout(total=remaining)
+                ) as response:
+                    bt.logging.debug(f"YOLO status code for {request_id}: {response.status}")
+                    if response.status >= 500:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status
+                        )
+                    response.raise_for_status()
+                    body = await response.json()
+                    return body.get("predictions", [])
+            except aiohttp.ClientResponseError as e:
+                bt.logging.warning(f"YOLO request {request_id} failed (attempt {attempt + 1}): {e}")
+                if e.status < 500:
+                    # The service rejected the payload, retrying it will not help
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                bt.logging.warning(f"YOLO request {request_id} failed (attempt {attempt + 1}): {e!r}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(min(self.backoff * 2 ** attempt, max(deadline - loop.time(), 0)))
+
+        raise DetectorError(f"YOLO request {request_id} gave up after {attempt + 1} attempt(s)")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def shutdown(self):
+        """Closes the session from outside its event loop, e.g. when the miner exits."""
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.close(), self._loop)
+
+
+class OnnxCheckboxDetector(CheckboxDetector):
+    """
+    In-process checkbox detection with an ONNX Runtime CPU session.
+
+    Expects a YOLOv8-style export: a single NCHW float input and an output of shape
+    (batch, 4 + num_classes, num_boxes) holding cx, cy, w, h followed by the class scores.
+    Images are letterboxed to the model input size and the boxes are mapped back to page pixels.
+    Inference runs on `executor` so it never blocks the event loop.
+
+    onnxruntime is an optional dependency, only needed when this backend is selected.
+    """
+
+    def __init__(self, model_path, executor=None, intra_op_threads=0, inter_op_threads=0, input_size=640,
+                 conf_threshold=0.25, iou_threshold=0.45, class_names=("unselected", "selected")):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx detector backend requires onnxruntime: pip install onnxruntime") from e
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Static exports fix the batch size and resolution, dynamic ones use None or a name instead
+        batch_dim, _, height_dim, width_dim = model_input.shape
+        self.batchable = not isinstance(batch_dim, int)
+        self.input_height = height_dim if isinstance(height_dim, int) else input_size
+        self.input_width = width_dim if isinstance(width_dim, int) else input_size
+
+        self.executor = executor
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.class_names = list(class_names)
+
+    def preprocess(self, image):
+        """Letterboxes a DecodedImage into the model input. Returns the CHW tensor, the scale and the (x, y) padding."""
+        pil_image = image.image if image.image.mode == "RGB" else image.image.convert("RGB")
+        scale = min(self.input_width / image.width, self.input_height / image.height)
+        new_width, new_height = max(int(round(image.width * scale)), 1), max(int(round(image.height * scale)), 1)
+        resized = np.asarray(pil_image.resize((new_width, new_height)))
+
+        pad_x, pad_y = (self.input_width - new_width) // 2, (self.input_height - new_height) // 2
+        tensor = np.full((self.input_height, self.input_width, 3), 114, dtype=np.uint8)
+        tensor[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = resized
+        tensor = tensor.transpose(2, 0, 1).astype(np.float32) / 255.0
+        return tensor, scale, (pad_x, pad_y)
+
+    def postprocess(self, output, scale, padding, width, height):
+        """Turns the raw (4 + num_classes, num_boxes) output of one image into predictions."""
+        output = output.T
+        class_scores = output[:, 4:]
+        classes = class_scores.argmax(axis=1)
+        confidences = class_scores[np.arange(len(classes)), classes]
+        mask = confidences > self.conf_threshold
+        output, classes, confidences = output[mask], classes[mask], confidences[mask]
+
+        cx, cy, w, h = output[:, 0], output[:, 1], output[:, 2], output[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        boxes -= np.array([padding[0], padding[1], padding[0], padding[1]], dtype=np.float32)
+        boxes /= scale
+        boxes = np.clip(boxes, 0, [width, height, width, height])
+
+        predictions = []
+        # Class-agnostic: a checkbox is either selected or unselected, never both
+        for index in non_max_suppression(boxes, confidences, self.iou_threshold):
+            x1, y1, x2, y2 = (int(round(v)) for v in boxes[index])
+            class_id = int(classes[index])
+            predictions.append({
+                "state": self.class_names[class_id] if class_id < len(self.class_names) else str(class_id),
+                "confidence": float(confidences[index]),
+                "boundingBox": [x1, y1, x2, y1, x2, y2, x1, y2],
+            })
+        return predictions
+
+    def predict_images(self, images):
+        """Blocking detection for a list of DecodedImages."""
+        prepared = [self.preprocess(image) for image in images]
+        if self.batchable:
+            outputs = self.session.run(None, {self.input_name: np.stack([tensor for tensor, _, _ in prepared])})[0]
+        else:
+            outputs = [self.session.run(None, {self.input_name: tensor[None]})[0][0] for tensor, _, _ in prepared]
+        return [
+            self.postprocess(output, scale, padding, image.width, image.height)
+            for output, (_, scale, padding), image in zip(outputs, prepared, images)
+        ]
+
+    async def predict(self, image, request_id, timeout=None):
+        predictions = (await self.predict_batch([image], [request_id], timeout))[0]
+        if isinstance(predictions, Exception):
+            raise predictions
+        return predictions
+
+    async def predict_batch(self, images, request_ids, timeout=None):
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, self.predict_images, images), timeout)
+        except Exception as e:
+            bt.logging.error(f"ONNX detection failed for {', '.join(request_ids)}: {e!r}")
+            error = DetectorError(f"ONNX detection failed: {e!r}")
+            return [error] * len(images)
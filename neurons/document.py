@@ -0,0 +1,178 @@
+import numpy as np
+
+# Corner order of the 8-point boxes of the OCR result: top-left, top-right, bottom-right, bottom-left
+POLYGON_CORNERS = [0, 1, 2, 1, 2, 3, 0, 3]
+
+
+class LineIndex():
+    """
+    Spatial index of the lines of a page: their indices sorted by top edge, so the lines that start
+    within a vertical range are found by binary search instead of a scan of the page.
+    """
+
+    def __init__(self, line_boxes):
+        self.order = np.argsort(line_boxes[:, 1], kind="stable")
+        # float64 like the queries, searchsorted would otherwise cast the whole array on every call
+        self.tops = line_boxes[self.order, 1].astype(np.float64)
+
+    def lines_starting_between(self, low, high):
+        """Indices, in document order, of the lines whose top edge is strictly between `low` and `high`."""
+        start = np.searchsorted(self.tops, low, side="right")
+        end = np.searchsorted(self.tops, high, side="left")
+        return np.sort(self.order[start:end])
+
+
+class OcrDocument():
+    """
+    Words and lines of one OCR'd page, stored as a few flat numpy buffers instead of a dict per word.
+
+    Words are kept in reading order, line after line. All the text lives in one string in which the
+    words of a line are separated by a space and lines by a newline, so a line's text is a single slice.
+
+    Attributes:
+        width (int): Page width in pixels.
+        height (int): Page height in pixels.
+        text (str): Text of the page, one line of words per text line.
+        word_boxes (np.ndarray): (num_words, 4) int32 word boxes as x1, y1, x2, y2.
+        word_spans (np.ndarray): (num_words, 2) int32 start and end offsets of each word in `text`.
+        line_starts (np.ndarray): (num_lines + 1,) int32, words of line i are line_starts[i]:line_starts[i + 1].
+        line_boxes (np.ndarray): (num_lines, 4) int32 line boxes as x1, y1, x2, y2.
+    """
+
+    def __init__(self, width, height, text, word_boxes, word_spans, line_starts, line_boxes):
+        self.width = width
+        self.height = height
+        self.text = text
+        self.word_boxes = word_boxes
+        self.word_spans = word_spans
+        self.line_starts = line_starts
+        self.line_boxes = line_boxes
+        self._line_index = None
+
+    def __len__(self):
+        return len(self.line_boxes)
+
+    @classmethod
+    def empty(cls, width=0, height=0):
+        return cls(
+            width, height, "",
+            np.empty((0, 4), dtype=np.int32), np.empty((0, 2), dtype=np.int32),
+            np.zeros(1, dtype=np.int32), np.empty((0, 4), dtype=np.int32),
+        )
+
+    @classmethod
+    def from_ocr_data(cls, ocr_data, width, height, y_threshold=15, x_threshold=50):
+        """
+        Builds the document from `image_to_data` output, grouping the words into lines.
+
+        Words are grouped by Tesseract's own (block_num, par_num, line_num) and a line is also split
+        wherever the horizontal gap between two consecutive words reaches `x_threshold`, which separates
+        the columns of a form that Tesseract read as one line. Without line ids, consecutive words are
+        chained while their tops are less than `y_threshold` apart and the gap between them is less than
+        `x_threshold`.
+        """
+        keep = np.fromiter((bool(text.strip()) for text in ocr_data['text']), dtype=bool, count=len(ocr_data['text']))
+        index = np.flatnonzero(keep)
+        if not index.size:
+            return cls.empty(width, height)
+        words = [ocr_data['text'][i] for i in index]
+        left = np.asarray(ocr_data['left'], dtype=np.int32)[index]
+        top = np.asarray(ocr_data['top'], dtype=np.int32)[index]
+        right = left + np.asarray(ocr_data['width'], dtype=np.int32)[index]
+        bottom = top + np.asarray(ocr_data['height'], dtype=np.int32)[index]
+
+        gap = left[1:] - right[:-1]
+        if 'line_num' in ocr_data:
+            ids = np.stack([np.asarray(ocr_data[key], dtype=np.int32)[index] for key in ('block_num', 'par_num', 'line_num')], axis=1)
+            breaks = np.any(ids[1:] != ids[:-1], axis=1) | (gap >= x_threshold)
+        else:
+            breaks = (np.abs(top[1:] - top[:-1]) >= y_threshold) | (np.abs(gap) >= x_threshold)
+        starts = np.flatnonzero(np.concatenate(([True], breaks)))
+
+        line_boxes = np.stack([
+            np.minimum.reduceat(left, starts), np.minimum.reduceat(top, starts),
+            np.maximum.reduceat(right, starts), np.maximum.reduceat(bottom, starts),
+        ], axis=1)
+
+        # Each word is followed by a space, or by a newline when it ends its line
+        lengths = np.fromiter((len(word) for word in words), dtype=np.int32, count=len(words))
+        word_starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1])).astype(np.int32)
+        separators = np.full(len(words), " ", dtype=object)
+        separators[np.append(starts[1:], len(words)) - 1] = "\n"
+        text = "".join([word + separator for word, separator in zip(words, separators)])
+
+        return cls(
+            width, height, text,
+            np.stack([left, top, right, bottom], axis=1),
+            np.stack([word_starts, word_starts + lengths], axis=1),
+            np.append(starts, len(words)).astype(np.int32),
+            line_boxes.astype(np.int32),
+        )
+
+    @classmethod
+    def from_dict(cls, result):
+        """Builds the document from the dict form returned by `to_dict`, e.g. an OCR result saved as JSON."""
+        ocr_data = {key: [] for key in ('text', 'left', 'top', 'width', 'height', 'line_num')}
+        for line_num, line in enumerate(result.get('lines', [])):
+            words = line.get('words') or [{"boundingBox": line['boundingBox'], "text": line['text']}]
+            for word in words:
+                box = word['boundingBox']
+                x1, y1, x2, y2 = min(box[::2]), min(box[1::2]), max(box[::2]), max(box[1::2])
+                for key, value in zip(ocr_data, (word['text'], x1, y1, x2 - x1, y2 - y1, line_num)):
+                    ocr_data[key].append(value)
+        ocr_data['block_num'] = ocr_data['par_num'] = [0] * len(ocr_data['text'])
+        # Lines are taken as they are, no geometric split
+        return cls.from_ocr_data(ocr_data, result.get('width', 0), result.get('height', 0), x_threshold=np.inf)
+
+    @property
+    def line_index(self):
+        """LineIndex over the lines, built on first use. Concurrent first uses at worst build it twice."""
+        if self._line_index is None:
+            self._line_index = LineIndex(self.line_boxes)
+        return self._line_index
+
+    def line_text(self, i):
+        return self.text[self.word_spans[self.line_starts[i], 0]:self.word_spans[self.line_starts[i + 1] - 1, 1]]
+
+    def line_texts(self):
+        return self.text.split("\n")[:len(self)]
+
+    def line_polygons(self):
+        """(num_lines, 8) line boxes in the [x1, y1, x2, y1, x2, y2, x1, y2] form of the OCR result."""
+        return self.line_boxes[:, POLYGON_CORNERS]
+
+    def to_compact(self):
+        """JSON-serializable form of the document, as flat lists. Inverse of `from_compact`."""
+        return {
+            "width": self.width,
+            "height": self.height,
+            "text": self.text,
+            "word_boxes": self.word_boxes.ravel().tolist(),
+            "word_spans": self.word_spans.ravel().tolist(),
+            "line_starts": self.line_starts.tolist(),
+            "line_boxes": self.line_boxes.ravel().tolist(),
+        }
+
+    @classmethod
+    def from_compact(cls, compact):
+        return cls(
+            compact["width"], compact["height"], compact["text"],
+            np.asarray(compact["word_boxes"], dtype=np.int32).reshape(-1, 4),
+            np.asarray(compact["word_spans"], dtype=np.int32).reshape(-1, 2),
+            np.asarray(compact["line_starts"], dtype=np.int32),
+            np.asarray(compact["line_boxes"], dtype=np.int32).reshape(-1, 4),
+        )
+
+    def to_dict(self):
+        """The page as the nested dict of lines and words the OCR result used to be, e.g. to save it as JSON."""
+        word_polygons = self.word_boxes[:, POLYGON_CORNERS].tolist()
+        word_texts = [self.text[start:end] for start, end in self.word_spans.tolist()]
+        line_polygons = self.line_polygons().tolist()
+        lines = []
+        for i, (start, end) in enumerate(zip(self.line_starts[:-1].tolist(), self.line_starts[1:].tolist())):
+            lines.append({
+                "boundingBox": line_polygons[i],
+                "text": " ".join(word_texts[start:end]),
+                "words": [{"boundingBox": word_polygons[j], "text": word_texts[j]} for j in range(start, end)],
+            })
+        return {"page": 1, "width": self.width, "height": self.height, "unit": "pixel", "lines": lines}
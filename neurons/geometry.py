@@ -0,0 +1,65 @@
+import numpy as np
+
+
+def polygons_to_xyxy(polygons):
+    """Converts (N, 2k) polygons [x1, y1, x2, y2, ...] to (N, 4) x1, y1, x2, y2 boxes around them."""
+    polygons = np.asarray(polygons, dtype=np.float64).reshape(len(polygons), -1)
+    xs, ys = polygons[:, 0::2], polygons[:, 1::2]
+    return np.stack([xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)], axis=1)
+
+
+def overlap_matrix(boxes_a, boxes_b, method="iou"):
+    """
+    Pairwise overlap of (N, 4) and (M, 4) boxes in x1, y1, x2, y2 form, as an (N, M) matrix.
+
+    The intersection area is divided by the union of the two boxes ("iou"), by the smaller of their
+    areas ("min", like YoloCheckboxDetector.isOverlapping) or by the larger one ("max").
+    Pairs involving an empty box overlap by 0.
+    """
+    a, b = np.asarray(boxes_a, dtype=np.float64)[:, None, :], np.asarray(boxes_b, dtype=np.float64)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    if method == "min":
+        denominator = np.minimum(area_a, area_b)
+    elif method == "max":
+        denominator = np.maximum(area_a, area_b)
+    elif method == "iou":
+        denominator = area_a + area_b - intersection
+    else:
+        raise ValueError(f"Unknown overlap method: {method}")
+    empty = (area_a <= 0) | (area_b <= 0)
+    return np.where(empty, 0.0, intersection / np.where(empty, 1.0, denominator))
+
+
+def non_max_suppression(boxes, scores, threshold, method="iou"):
+    """
+    Greedy NMS over (N, 4) boxes in x1, y1, x2, y2 form: boxes are visited best score first and every
+    box overlapping a kept one by more than `threshold` (see overlap_matrix for `method`) is dropped.
+    Returns the indices kept, best score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for index in order:
+        if suppressed[index]:
+            continue
+        keep.append(index)
+        # One row of the overlap matrix per kept box, so raw model outputs never need an N x N matrix
+        suppressed |= overlap_matrix(boxes[index:index + 1], boxes, method)[0] > threshold
+    return np.array(keep, dtype=np.int64)
+
+
+def cluster_starts(positions, max_gap):
+    """
+    Groups 1-D positions into clusters, split wherever two consecutive sorted positions are more than
+    `max_gap` apart, and returns the sorted smallest position of each cluster. The cluster of any position
+    is then `np.searchsorted(starts, position, side="right") - 1`.
+    """
+    positions = np.sort(np.asarray(positions, dtype=np.float64).ravel())
+    if not positions.size:
+        return positions
+    return positions[np.concatenate(([True], np.diff(positions) > max_gap))]
@@ -0,0 +1,87 @@
+import base64
+import binascii
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+
+MINIMUM_ACCEPTABLE_SIZE = 50
+MAXIMUM_ACCEPTABLE_SIZE = 10000
+# Longest side an oversized image is reduced to
+REDUCED_IMAGE_SIZE = 9990
+
+
+class ImageDecodeError(ValueError):
+    """Raised when the image sent with a synapse can't be decoded or is unusable."""
+
+
+class DecodedImage():
+    """
+    An image decoded once per request and shared by every stage of the miner pipeline.
+
+    Attributes:
+        raw (bytes): The encoded image file (PNG, JPEG, ...).
+        image (PIL.Image.Image): The decoded image, already loaded into memory.
+        width (int): Width in pixels.
+        height (int): Height in pixels.
+        digest (str): Hash of the bytes received from the validator, used as the cache key.
+    """
+
+    def __init__(self, raw, image, digest, encoded=None):
+        self.raw = raw
+        self.image = image
+        self.digest = digest
+        self.width, self.height = image.size
+        self._encoded = encoded
+
+    @property
+    def encoded(self):
+        """Base64 form of `raw`, as expected by the YOLO service. The incoming string is reused when possible."""
+        if self._encoded is None:
+            self._encoded = base64.b64encode(self.raw).decode("utf-8")
+        return self._encoded
+
+
+def reduce_image_dimension(image, maximum_size=REDUCED_IMAGE_SIZE):
+    """Downscales a PIL image so that its longest side is at most `maximum_size`, keeping the aspect ratio."""
+    scaling_factor = min(maximum_size / image.height, maximum_size / image.width)
+    new_size = (int(image.width * scaling_factor), int(image.height * scaling_factor))
+    return image.resize(new_size)
+
+
+def decode_image(encoded):
+    """
+    Decodes and validates a base64-encoded image.
+
+    Images larger than MAXIMUM_ACCEPTABLE_SIZE on either side are downscaled so OCR can handle them.
+
+    Args:
+        encoded (str): Base64-encoded image, as carried by `ProfileSynapse.img_path`.
+
+    Returns:
+        DecodedImage: The decoded image.
+
+    Raises:
+        ImageDecodeError: If the payload isn't a valid image, is too large to decode or is smaller than 50x50 pixels.
+    """
+    try:
+        raw = base64.b64decode(encoded)
+        image = Image.open(BytesIO(raw))
+        image.load()
+    except (binascii.Error, ValueError, OSError, Image.DecompressionBombError) as e:
+        # DecompressionBombError: more pixels than PIL agrees to decode (about 179 megapixels)
+        raise ImageDecodeError(f"Could not decode image: {e}") from e
+    digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    if image.height < MINIMUM_ACCEPTABLE_SIZE or image.width < MINIMUM_ACCEPTABLE_SIZE:
+        raise ImageDecodeError(
+            f"Image is smaller than required size ({MINIMUM_ACCEPTABLE_SIZE}x{MINIMUM_ACCEPTABLE_SIZE})"
+        )
+
+    if image.height > MAXIMUM_ACCEPTABLE_SIZE or image.width > MAXIMUM_ACCEPTABLE_SIZE:
+        image = reduce_image_dimension(image)
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        return DecodedImage(buffer.getvalue(), image, digest)
+
+    return DecodedImage(raw, image, digest, encoded=encoded)
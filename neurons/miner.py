@@ -19,23 +19,44 @@
 
 import time
 import typing
+import asyncio
 import bittensor as bt
 
 import sys
 import os
+import glob
+import base64
+import json
+import hashlib
+import pytesseract
 
 # Add the parent directory to the system path
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Bittensor Miner Template:
 import template
+from template.miner import (
+    ResultCache,
+    SingleFlight,
+    AdmissionQueue,
+    AdmissionRejected,
+    MicroBatcher,
+    MinerMetrics,
+    MetricsServer,
+    DeadlinePlanner,
+)
+from template.miner.deadline import FULL, DOWNSCALED, ROI, CACHED
 
 # import base miner class which takes care of most of the boilerplate
 from template.base.miner import BaseMinerNeuron
 
-import base64
-from ocr import ocr_image_with_custom_line_detection
+from image import decode_image, ImageDecodeError
+from ocr import ocr_image_with_custom_line_detection, ocr_image_regions
+from document import OcrDocument
+from ocr_engine import TesseractPool, EngineBusyError, CancelToken, load_tesseract_config
 from postprocessor import YoloCheckboxDetector
-import requests
+from detector import HttpCheckboxDetector, OnnxCheckboxDetector
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
 from logging.handlers import TimedRotatingFileHandler
 import logging
 
@@ -63,36 +84,337 @@ class Miner(BaseMinerNeuron):
         root_logger = logging.getLogger()  # Get the root logger instance
         root_logger.addHandler(log_handler)
 
-    # Helper functions for the miner's logic
-    def get_yolo_response(self, img_path, request_id):
-        # with open(img_path, "rb") as image_file:
-        #     encoded_string = base64.b64encode(image_file.read()).decode()
+        # OCR and checkbox detection are blocking calls, so they are handed to this pool
+        # instead of running on the axon's event loop.
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config.neuron.num_workers,
+            thread_name_prefix="miner-worker",
+        )
+
+        # Warm Tesseract workers, so OCR doesn't pay a process spawn and traindata load per image
+        tesseract_config = load_tesseract_config(self.config.ocr.config_file) if self.config.ocr.config_file else {}
+        self.ocr_engine = TesseractPool(
+            num_workers=self.config.ocr.num_workers,
+            max_queue=self.config.ocr.max_queue,
+            queue_timeout=self.config.ocr.queue_timeout,
+            lang=self.config.ocr.lang,
+            **tesseract_config,
+        )
+
+        if self.config.detector.backend == "onnx":
+            # In-process detection, without the sidecar's HTTP and base64 overhead
+            self.detector = OnnxCheckboxDetector(
+                model_path=self.config.detector.model_path,
+                executor=self.executor,
+                intra_op_threads=self.config.detector.intra_op_threads,
+                inter_op_threads=self.config.detector.inter_op_threads,
+                input_size=self.config.detector.input_size,
+                conf_threshold=self.config.detector.conf_threshold,
+                iou_threshold=self.config.detector.iou_threshold,
+                class_names=self.config.detector.class_names.split(","),
+            )
+        else:
+            # Long-lived client for the YOLO service, reusing pooled keep-alive connections
+            self.detector = HttpCheckboxDetector(
+                endpoint=self.config.yolo.endpoint,
+                timeout=self.config.yolo.timeout,
+                max_retries=self.config.yolo.max_retries,
+                pool_size=self.config.yolo.pool_size,
+                keepalive_timeout=self.config.yolo.keepalive_timeout,
+                batch_endpoint=self.config.yolo.batch_endpoint or None,
+            )
+
+        # Overlapping requests are sent to the detector together when a batching window is set
+        self.detection_batcher = None
+        if self.config.batching.window_ms > 0:
+            self.detection_batcher = MicroBatcher(
+                self.detect_batch,
+                max_batch_size=self.config.batching.max_batch_size,
+                max_wait=self.config.batching.window_ms / 1000,
+            )
+
+        # Stateless, shared by every request and executor thread
+        self.postprocessor = YoloCheckboxDetector(
+            self.config.association.engine,
+            nms_threshold=self.config.association.nms_threshold,
+            nms_method=self.config.association.nms_method,
+            multiline=self.config.association.multiline,
+        )
+
+        # Validators draw from a finite dataset, so the same image comes back many times
+        self.cache = None
+        if not self.config.cache.off:
+            self.cache = ResultCache(
+                max_entries=self.config.cache.max_entries,
+                max_bytes=self.config.cache.max_bytes,
+                ttl=self.config.cache.ttl,
+                persist_dir=(
+                    os.path.join(self.config.neuron.full_path, "result_cache") if self.config.cache.persist else None
+                ),
+            )
 
-        # Prepare the request payload
-        payload = {'image': img_path, "request_id": request_id}
+        # Entries depend on these settings as much as on the image: a miner restarted with other settings
+        # must not answer from entries computed, and persisted, under the old ones
+        output_settings = {
+            "detector": [self.config.detector.backend, self.config.detector.model_path, self.config.detector.input_size,
+                         self.config.detector.conf_threshold, self.config.detector.iou_threshold, self.config.yolo.endpoint],
+            "ocr": [tesseract_config, self.config.ocr.lang, self.config.ocr.preprocess,
+                    self.config.ocr.tile_megapixels, self.config.ocr.tile_overlap],
+            "pipeline": [self.config.pipeline.order, self.config.pipeline.roi_label_width],
+            "association": [self.config.association.engine, self.config.association.nms_threshold,
+                            self.config.association.nms_method, self.config.association.multiline],
+        }
+        self.cache_settings = hashlib.blake2b(
+            json.dumps(output_settings, sort_keys=True, default=str).encode(), digest_size=4
+        ).hexdigest()
+
+        # Concurrent requests for the same image share one pipeline run
+        self.singleflight = SingleFlight()
+
+        # Caps the number of documents processed at once; the rest wait in stake order or are turned away
+        self.admission = AdmissionQueue(
+            max_inflight=self.config.admission.max_inflight,
+            max_queue=self.config.admission.max_queue,
+        )
+
+        # Chooses between full, downscaled and region-of-interest processing from the time left
+        self.planner = DeadlinePlanner(downscale=self.config.deadline.downscale)
+
+        self.metrics = MinerMetrics()
+        self.metrics.set_gauge("queue_depth", lambda: self.admission.depth)
+        self.metrics.set_gauge("inflight_documents", lambda: self.admission.inflight)
+        self.metrics.set_gauge("queue_wait_seconds", lambda: self.admission.wait_time)
+        self.metrics.set_gauge("admission_rejected_full", lambda: self.admission.rejected_full)
+        self.metrics.set_gauge("admission_rejected_deadline", lambda: self.admission.rejected_deadline)
+        if self.cache is not None:
+            self.metrics.set_gauge("cache_hit_rate", lambda: self.cache.stats()["hit_rate"])
+            self.metrics.set_gauge("cache_hits", lambda: self.cache.hits)
+            self.metrics.set_gauge("cache_misses", lambda: self.cache.misses)
+            self.metrics.set_gauge("cache_size_bytes", lambda: self.cache.size_bytes)
+        if self.detection_batcher is not None:
+            self.metrics.set_gauge("detection_batch_size_mean", lambda: self.detection_batcher.mean_batch_size)
+        self.metrics_server = None
+        if not self.config.metrics.off and self.config.metrics.port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, host=self.config.metrics.host, port=self.config.metrics.port)
+            except OSError as e:
+                # Metrics are optional, a port already in use must not keep the miner from serving
+                bt.logging.error(f"Could not serve metrics on {self.config.metrics.host}:{self.config.metrics.port}: {e}")
+            else:
+                self.metrics_server.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        self.detector.shutdown()
+        self.ocr_engine.shutdown()
+        self.executor.shutdown(wait=False)
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+    def warmup(self):
+        """
+        Runs the warm-up images through the full pipeline `--warmup.iterations` times and logs the latencies,
+        so Tesseract traindata, the detector model, connections and lazy imports are all loaded before the
+        axon starts.
+        """
+        if self.config.warmup.iterations <= 0:
+            return
+        images_dir = self.config.warmup.images_dir or os.path.join(os.path.dirname(__file__), "..", "test_images")
+        paths = sorted(glob.glob(os.path.join(images_dir, "*.jpg")))
+        if not paths:
+            bt.logging.warning(f"No warm-up images found in {images_dir}")
+            return
+
+        bt.logging.info(f"Warming up the miner with {len(paths)} image(s) x {self.config.warmup.iterations}")
+        self.ocr_engine.warmup()
+        encoded_images = []
+        for path in paths:
+            with open(path, "rb") as image_file:
+                encoded_images.append((os.path.basename(path), base64.b64encode(image_file.read()).decode("utf-8")))
+        asyncio.run(self.run_warmup(encoded_images))
+
+    async def run_warmup(self, encoded_images):
         try:
-            response = requests.post('http://127.0.0.1:5000/predict', json=payload)
-            print(f"Status Code: {response.status_code}")
-            predictions = response.json().get("predictions", [])
-            print(f"Response: {predictions}")
-            return predictions
+            for iteration in range(self.config.warmup.iterations):
+                for name, encoded in encoded_images:
+                    start = time.perf_counter()
+                    image = decode_image(encoded)
+                    # The first pass pays the cold-start costs, it would skew the planner's rates
+                    await self.postprocess(image, f"warmup-{iteration}-{name}", learn=iteration > 0)
+                    bt.logging.info(f"Warm-up {iteration + 1}/{self.config.warmup.iterations} {name}: {time.perf_counter() - start:.3f}s")
+        finally:
+            # The session belongs to this temporary loop, the axon's loop opens its own
+            await self.detector.close()
+
+    # Helper functions for the miner's logic
+    def cache_get(self, image, kind):
+        if self.cache is None:
+            return None
+        return self.cache.get(f"{image.digest}-{self.cache_settings}-{kind}")
+
+    def cache_put(self, image, kind, value):
+        if self.cache is not None:
+            self.cache.put(f"{image.digest}-{self.cache_settings}-{kind}", value)
+
+    async def cache_put_async(self, image, kind, value):
+        """cache_put from the event loop: serializing the value and writing it to disk would stall every request."""
+        if self.cache is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.cache_put, image, kind, value)
+
+    async def detect_batch(self, items):
+        images, request_ids = zip(*items)
+        return await self.detector.predict_batch(list(images), list(request_ids))
+
+    async def get_yolo_response(self, image, request_id):
+        """Returns the YOLO predictions for the image, or None if the service could not be reached."""
+        if self.config.cache.intermediates:
+            predictions = self.cache_get(image, "yolo")
+            if predictions is not None:
+                return predictions
+        try:
+            with self.metrics.span("detector", request_id):
+                if self.detection_batcher is not None:
+                    predictions = await self.detection_batcher.submit((image, request_id))
+                else:
+                    predictions = await self.detector.predict(image, request_id)
+            bt.logging.debug(f"Response: {predictions}")
         except Exception as e:
-            print(f"Request failed: {e}")
+            self.metrics.inc("errors", stage="detector")
+            bt.logging.error(f"Request failed: {e}")
             import traceback
             logging.error(traceback.format_exc())
-            return []
-
-    def get_ocr_response(self, img_path):
-        ocr_data = ocr_image_with_custom_line_detection(img_path)
+            return None
+        if self.config.cache.intermediates:
+            await self.cache_put_async(image, "yolo", predictions)
+        return predictions
+
+    def get_ocr_response(self, image, request_id=None, scale=1.0, cancel_token=None):
+        """Returns the OCR'd document for the image, or None if the OCR failed, its queue was full or it was cancelled."""
+        use_cache = self.config.cache.intermediates and scale == 1.0
+        if use_cache:
+            compact = self.cache_get(image, "document")
+            if compact is not None:
+                return OcrDocument.from_compact(compact)
+        try:
+            ocr_data = ocr_image_with_custom_line_detection(
+                image, engine=self.ocr_engine, metrics=self.metrics, request_id=request_id, scale=scale,
+                profile=self.config.ocr.preprocess, tile_megapixels=self.config.ocr.tile_megapixels,
+                tile_overlap=self.config.ocr.tile_overlap, cancel_token=cancel_token,
+            )
+        except EngineBusyError as e:
+            self.metrics.inc("errors", stage="ocr")
+            bt.logging.warning(f"OCR skipped: {e}")
+            return None
+        except CancelledError:
+            return None
+        except (BrokenProcessPool, pytesseract.TesseractError) as e:
+            # A crashed worker or a page Tesseract can't read: answer from the detections alone
+            self.metrics.inc("errors", stage="ocr")
+            bt.logging.error(f"OCR failed: {e!r}")
+            return None
+        if use_cache:
+            self.cache_put(image, "document", ocr_data.to_compact())
         return ocr_data
 
-    def postprocess(self, binary_image, request_id):
-        ocr_data = self.get_ocr_response(binary_image)
-        yolo_resp = self.get_yolo_response(binary_image, request_id)
-        postprocessor_object = YoloCheckboxDetector()
-        checkboxes = postprocessor_object.get_selected_checkboxes_with_text(yolo_resp, ocr_data, request_id)
+    def get_roi_ocr_response(self, image, regions, request_id=None):
+        """Returns the OCR'd document of the given page regions, or None if the OCR failed or its queue was full."""
+        try:
+            return ocr_image_regions(image, regions, engine=self.ocr_engine, metrics=self.metrics, request_id=request_id)
+        except EngineBusyError as e:
+            self.metrics.inc("errors", stage="ocr")
+            bt.logging.warning(f"OCR skipped: {e}")
+            return None
+        except (BrokenProcessPool, pytesseract.TesseractError) as e:
+            self.metrics.inc("errors", stage="ocr")
+            bt.logging.error(f"OCR failed: {e!r}")
+            return None
+
+    async def skip_ocr(self, image, request_id, ocr):
+        """Answers a page on which the detector found no checkbox worth labelling."""
+        self.metrics.inc("fast_path", ocr=ocr)
+        bt.logging.debug(f"[{request_id}] No selected checkbox, OCR {ocr}")
+        # Detection doesn't depend on the tier, so the empty answer is exact
+        await self.cache_put_async(image, "result", [])
+        return []
+
+    async def postprocess(self, image, request_id, tier=FULL, learn=True):
+        """
+        Detects the checkboxes of a page, OCRs it as the tier allows and returns the labelled selected checkboxes.
+        The latency is fed to the deadline planner unless `learn` is False.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        megapixels = image.width * image.height / 1e6
+
+        if tier == ROI or self.config.pipeline.order == "detect_first":
+            # Detect first, then OCR only around the selected checkboxes, or not at all if there are none
+            yolo_resp = await self.get_yolo_response(image, request_id)
+            candidates = self.postprocessor.get_candidate_checkboxes(yolo_resp or [])
+            if yolo_resp is not None and not candidates:
+                return await self.skip_ocr(image, request_id, "skipped")
+            regions = self.postprocessor.get_text_search_regions(
+                candidates, image.width, image.height, label_width=self.config.pipeline.roi_label_width
+            )
+            ocr_data = OcrDocument.empty(image.width, image.height)
+            if regions:
+                ocr_data = await loop.run_in_executor(
+                    self.executor, self.get_roi_ocr_response, image, regions, request_id
+                )
+        else:
+            scale = self.config.deadline.downscale if tier == DOWNSCALED else 1.0
+            yolo_resp = None
+            if self.config.cache.intermediates:
+                # Known detections cost nothing to wait for, and spare the OCR of pages without a selected checkbox
+                yolo_resp = self.cache_get(image, "yolo")
+                if yolo_resp is not None and not self.postprocessor.get_candidate_checkboxes(yolo_resp):
+                    return await self.skip_ocr(image, request_id, "skipped")
+            # OCR and YOLO are independent, so run them side by side: latency is max(OCR, YOLO)
+            cancel_token = CancelToken()
+            ocr_future = loop.run_in_executor(
+                self.executor, self.get_ocr_response, image, request_id, scale, cancel_token
+            )
+            if yolo_resp is None:
+                yolo_resp = await self.get_yolo_response(image, request_id)
+            if yolo_resp is not None and not self.postprocessor.get_candidate_checkboxes(yolo_resp):
+                # Drop the OCR: still queued on the executor or the Tesseract pool it never runs, only a
+                # Tesseract job already on a worker finishes in the background
+                cancel_token.cancel()
+                ocr_future.cancel()
+                ocr_future.add_done_callback(lambda future: future.cancelled() or future.exception())
+                return await self.skip_ocr(image, request_id, "abandoned")
+            ocr_data = await ocr_future
+        if learn:
+            self.planner.record(tier, megapixels, time.perf_counter() - start)
+
+        # Only a full-resolution result computed from both stages is worth remembering
+        complete = ocr_data is not None and yolo_resp is not None and tier == FULL
+        ocr_data = ocr_data if ocr_data is not None else OcrDocument.empty(image.width, image.height)
+        yolo_resp = yolo_resp if yolo_resp is not None else []
+
+        with self.metrics.span("get_selected_checkboxes_with_text", request_id):
+            checkboxes = await loop.run_in_executor(
+                self.executor,
+                self.postprocessor.get_selected_checkboxes_with_text,
+                yolo_resp,
+                ocr_data,
+                request_id,
+            )
+        if complete:
+            await self.cache_put_async(image, "result", checkboxes)
         return checkboxes
 
+    async def admitted_postprocess(self, image, request_id, priority, timeout, tier=FULL):
+        async with self.admission.slot(priority, timeout):
+            return await self.postprocess(image, request_id, tier)
+
+    def choose_tier(self, image, synapse, received_at):
+        """Picks the processing tier that fits in what is left of the synapse's timeout."""
+        if self.config.deadline.off or synapse.timeout is None:
+            return FULL
+        budget = synapse.timeout - (time.monotonic() - received_at) - self.config.deadline.margin
+        budget -= self.admission.estimated_wait()
+        return self.planner.choose(image.width * image.height / 1e6, budget)
+
     async def forward(
         self, synapse: template.protocol.ProfileSynapse
     ) -> template.protocol.ProfileSynapse:
@@ -111,12 +433,51 @@ class Miner(BaseMinerNeuron):
         """
         # TODO(developer): Replace with actual implementation logic.
         bt.logging.info(f"############## synapse recieved ############")
-        time.sleep(10)
-        checkbox_result = self.postprocess(synapse.img_path, synapse.task_id)
+        with self.metrics.span("forward", synapse.task_id):
+            return await self.process_synapse(synapse)
+
+    async def process_synapse(self, synapse):
+        received_at = time.monotonic()
+        self.metrics.inc("requests")
+        loop = asyncio.get_running_loop()
+        try:
+            # Decode once, every stage below works on the same DecodedImage
+            with self.metrics.span("decode", synapse.task_id):
+                image = await loop.run_in_executor(self.executor, decode_image, synapse.img_path)
+        except ImageDecodeError as e:
+            self.metrics.inc("errors", stage="decode")
+            bt.logging.warning(f"Rejecting task {synapse.task_id}: {e}")
+            synapse.checkbox_output = []
+            return synapse
+
+        checkbox_result = self.cache_get(image, "result")
+        if checkbox_result is not None:
+            tier = CACHED
+            bt.logging.info(f"Answering task {synapse.task_id} from cache")
+        else:
+            tier = self.choose_tier(image, synapse, received_at)
+            if tier != FULL:
+                bt.logging.info(f"Processing task {synapse.task_id} in {tier} mode to meet its {synapse.timeout}s timeout")
+            try:
+                checkbox_result = await self.singleflight.do(
+                    f"{image.digest}-{tier}",
+                    self.admitted_postprocess,
+                    image,
+                    synapse.task_id,
+                    await self.priority(synapse),
+                    synapse.timeout,
+                    tier,
+                )
+            except AdmissionRejected as e:
+                self.metrics.inc("errors", stage="admission")
+                bt.logging.warning(
+                    f"Rejecting task {synapse.task_id}: {e} "
+                    f"(queue depth {self.admission.depth}, {self.admission.inflight} in flight)"
+                )
+                checkbox_result = []
+        self.metrics.inc("tier", tier=tier)
         synapse.checkbox_output = checkbox_result
-        print("****************")
-        print(synapse.checkbox_output)
-        print("****************")
+        bt.logging.debug(f"Checkbox output for task {synapse.task_id}: {synapse.checkbox_output}")
         return synapse
 
     async def blacklist(
@@ -6,130 +6,195 @@ import json
 import os
 import logging
 import base64
-from io import BytesIO
+from contextlib import nullcontext
 
-def get_bounding_box(left, top, width, height):
+from document import OcrDocument
+from preprocess import preprocess_for_ocr, otsu_threshold
+
+def map_ocr_data_to_page(ocr_data, scale=1.0, offset_x=0, offset_y=0):
+    """
+    Map the word boxes of an OCR run on a resized and/or cropped image back to page pixels.
+    `scale` is the resize factor that was applied to the page, (offset_x, offset_y) the page position of the crop.
+    """
+    mapped = dict(ocr_data)
+    mapped['left'] = [int(round(v / scale)) + offset_x for v in ocr_data['left']]
+    mapped['top'] = [int(round(v / scale)) + offset_y for v in ocr_data['top']]
+    mapped['width'] = [int(round(v / scale)) for v in ocr_data['width']]
+    mapped['height'] = [int(round(v / scale)) for v in ocr_data['height']]
+    return mapped
+
+def concatenate_ocr_data(parts):
     """
-    Convert left, top, width, height into a bounding box format [x1, y1, x2, y1, x2, y2, x1, y2].
+    Concatenate the OCR data of several crops into one, renumbering blocks so words from
+    different crops never share a block.
     """
-    x1, y1 = left, top
-    x2, y2 = left + width, top + height
-    # Return the bounding box in the format: top-left, top-right, bottom-right, bottom-left
-    return [x1, y1, x2, y1, x2, y2, x1, y2]
+    merged = {key: [] for key in ('text', 'left', 'top', 'width', 'height', 'conf', 'block_num', 'par_num', 'line_num')}
+    block_offset = 0
+    for part in parts:
+        for key in merged:
+            if key == 'block_num':
+                merged[key].extend(block + block_offset for block in part[key])
+            else:
+                merged[key].extend(part[key])
+        block_offset += max(part['block_num'], default=0)
+    return merged
+
+def filter_ocr_data(ocr_data, keep):
+    """Keep only the words whose index is flagged in the boolean sequence `keep`."""
+    return {key: [value for value, k in zip(values, keep) if k] for key, values in ocr_data.items()}
 
-def are_words_on_same_line(word1, word2, y_threshold=15, x_threshold=50):
+def find_band_cuts(img, num_bands, search_fraction=0.25):
     """
-    Determine if two words are on the same line based on the vertical position (y-axis)
-    and their proximity in the x-axis.
+    Choose the rows at which to split a page into `num_bands` horizontal bands of similar height.
+
+    Each cut is moved from its even split point to the nearest row with the least ink within
+    `search_fraction` of a band height, so cuts fall between text lines whenever possible.
+    Returns the band limits [0, cut_1, ..., height].
     """
-    # Check vertical proximity (y-axis)
-    if abs(word1['top'] - word2['top']) < y_threshold:
-        # Check horizontal proximity (x-axis)
-        if abs(word1['left'] + word1['width'] - word2['left']) < x_threshold:
-            return True
-    return False
-
-def group_words_into_lines(ocr_data, y_threshold=15, x_threshold=50):
+    gray = np.asarray(img if img.mode == "L" else img.convert("L"))
+    ink_per_row = (gray < otsu_threshold(gray)).sum(axis=1)
+    height = gray.shape[0]
+    band_height = height / num_bands
+    window = max(int(band_height * search_fraction), 1)
+    cuts = [0]
+    for k in range(1, num_bands):
+        ideal = int(k * band_height)
+        low, high = max(ideal - window, cuts[-1] + 1), min(ideal + window, height - 1)
+        if high < low:
+            cuts.append(ideal)
+            continue
+        # Among the rows with the least ink, the one nearest the even split keeps the bands balanced
+        segment = ink_per_row[low:high + 1]
+        rows = low + np.flatnonzero(segment == segment.min())
+        cuts.append(int(rows[np.argmin(np.abs(rows - ideal))]))
+    cuts.append(height)
+    return cuts
+
+def _run_tesseract_tiled(img, engine, num_bands, overlap=40, cancel_token=None):
     """
-    Group words into lines based on their bounding box proximity.
+    OCR a page as `num_bands` overlapping horizontal bands in parallel on the engine's workers.
+
+    Bands extend `overlap` pixels past their cuts so words crossing a cut are read whole at
+    least once. A word is kept only from the band whose own rows (cut to cut) hold its vertical
+    center, which removes the duplicates from the overlaps. Boxes are in `img` pixels.
     """
-    lines = []
-    current_line = []
-
-    for i in range(len(ocr_data['text'])):
-        word_text = ocr_data['text'][i]
-        if word_text.strip():  # Ignore empty strings
-            word_data = {
-                'text': word_text,
-                'left': ocr_data['left'][i],
-                'top': ocr_data['top'][i],
-                'width': ocr_data['width'][i],
-                'height': ocr_data['height'][i],
-                'bounding_box': get_bounding_box(ocr_data['left'][i], ocr_data['top'][i],
-                                                 ocr_data['width'][i], ocr_data['height'][i])
-            }
-
-            if not current_line:
-                current_line.append(word_data)
-            else:
-                last_word = current_line[-1]
-                if are_words_on_same_line(last_word, word_data, y_threshold, x_threshold):
-                    current_line.append(word_data)
-                else:
-                    lines.append(current_line)
-                    current_line = [word_data]
-    
-    if current_line:
-        lines.append(current_line)
-
-    return lines
-
-def ocr_image_with_custom_line_detection(binary_image, save_ocr=False):
+    cuts = find_band_cuts(img, num_bands)
+    bands = [(max(top - overlap, 0), min(bottom + overlap, img.height), top, bottom)
+             for top, bottom in zip(cuts, cuts[1:])]
+    futures = [
+        engine.submit(img.crop((0, band_top, img.width, band_bottom)), cancel_token=cancel_token)
+        for band_top, band_bottom, _, _ in bands
+    ]
+    parts = []
+    for (band_top, _, top, bottom), future in zip(bands, futures):
+        part = map_ocr_data_to_page(future.result(), 1.0, 0, band_top)
+        parts.append(filter_ocr_data(part, [
+            top <= t + h / 2 < bottom for t, h in zip(part['top'], part['height'])
+        ]))
+    return concatenate_ocr_data(parts)
+
+def _run_tesseract(img, engine=None, psm=None, cancel_token=None):
+    if engine is not None:
+        return engine.image_to_data(img, psm=psm, cancel_token=cancel_token)
+    config = f"--psm {psm}" if psm is not None else ""
+    return pytesseract.image_to_data(img, config=config, output_type=pytesseract.Output.DICT)
+
+def ocr_image_with_custom_line_detection(image, save_ocr=False, engine=None, metrics=None, request_id=None, scale=1.0,
+                                         profile="none", tile_megapixels=0, tile_overlap=40, cancel_token=None):
     """
-    Perform OCR on an image and return the text organized by lines based on proximity-based grouping.
+    Perform OCR on an image and return its words organized by lines as a document.OcrDocument.
     Optionally save the result to a .json file if save_ocr is set to True.
+
+    `image` is the DecodedImage produced once per request by image.decode_image. When `engine`
+    (an ocr_engine.TesseractPool) is given, OCR runs on its warm workers instead of a fresh
+    tesseract process. When `metrics` (a template.miner.MinerMetrics) is given, the Tesseract
+    call and the line grouping are timed. With `scale` < 1 the page is downscaled before OCR.
+    `profile` names one of preprocess.PROFILES applied to the page before OCR. Pages larger than
+    `tile_megapixels` (0 disables tiling) are split into one horizontal band per engine worker,
+    OCR'd in parallel. Boxes are always mapped back to page pixels. `cancel_token` (an
+    ocr_engine.CancelToken) cancels the engine jobs still queued, which then raise CancelledError.
     """
-    # img = Image.open(BytesIO(binary_image))
-    # Step 1:
-    image_data = base64.b64decode(binary_image)
-
-    # Step 2: Wrap the bytes in a BytesIO stream
-    image_stream = BytesIO(image_data)
-
-    # Step 3: Open the image using PIL
-    img = Image.open(image_stream)
-
-    ocr_data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
-
-    lines = group_words_into_lines(ocr_data)
-
-    # Prepare the final result
-    result = {
-        "page": 1,
-        "width": img.width,
-        "height": img.height,
-        "unit": "pixel",
-        "lines": []
-    }
-
-    for line in lines:
-        line_text = " ".join([word['text'] for word in line])
-        line_bounding_box = [
-            min([word['bounding_box'][0] for word in line]),  # left-most (x1)
-            min([word['bounding_box'][1] for word in line]),  # top-most (y1)
-            max([word['bounding_box'][2] for word in line]),  # right-most (x2)
-            max([word['bounding_box'][5] for word in line])   # bottom-most (y2)
-        ]
-        # Convert the bounding box for the line to the required format
-        line_bounding_box = [
-            line_bounding_box[0], line_bounding_box[1],  # top-left
-            line_bounding_box[2], line_bounding_box[1],  # top-right
-            line_bounding_box[2], line_bounding_box[3],  # bottom-right
-            line_bounding_box[0], line_bounding_box[3]   # bottom-left
-        ]
-
-        result['lines'].append({
-            "boundingBox": line_bounding_box,
-            "text": line_text,
-            "words": [
-                {
-                    "boundingBox": word['bounding_box'],
-                    "text": word['text']
-                } for word in line
-            ]
-        })
-    
+    def span(stage):
+        return metrics.span(stage, request_id) if metrics is not None else nullcontext()
+
+    with span("preprocess"):
+        prepared = preprocess_for_ocr(image.image, profile, scale)
+
+    img = prepared.image
+    num_bands = min(getattr(engine, 'num_workers', 1), img.height // (4 * tile_overlap + 1) or 1)
+    tiled = tile_megapixels and num_bands > 1 and img.width * img.height > tile_megapixels * 1e6
+    with span("ocr"):
+        if tiled:
+            ocr_data = _run_tesseract_tiled(img, engine, num_bands, tile_overlap, cancel_token)
+        else:
+            ocr_data = _run_tesseract(img, engine, cancel_token=cancel_token)
+    if prepared.scale != 1.0 or prepared.offset != (0, 0):
+        ocr_data = map_ocr_data_to_page(ocr_data, prepared.scale, *prepared.offset)
+
+    with span("group_words_into_lines"):
+        result = OcrDocument.from_ocr_data(ocr_data, image.width, image.height)
+
     # Save OCR result to a JSON file if save_ocr is True
     if save_ocr:
         json_filename = os.path.splitext(image_path)[0] + ".json"
         with open(json_filename, 'w') as json_file:
-            json.dump(result, json_file, indent=4)
+            json.dump(result.to_dict(), json_file, indent=4)
         print(f"OCR result saved to {json_filename}")
 
     return result
 
+def merge_regions(regions):
+    """
+    Merge overlapping (x1, y1, x2, y2) rectangles until no two of them overlap, so that
+    no part of the page is OCR'd twice.
+    """
+    merged = sorted(regions, key=lambda region: (region[1], region[0]))
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for region in merged:
+            for i, other in enumerate(result):
+                if region[0] < other[2] and other[0] < region[2] and region[1] < other[3] and other[1] < region[3]:
+                    result[i] = (min(region[0], other[0]), min(region[1], other[1]),
+                                 max(region[2], other[2]), max(region[3], other[3]))
+                    changed = True
+                    break
+            else:
+                result.append(region)
+        merged = result
+    return merged
+
+def ocr_image_regions(image, regions, engine=None, metrics=None, request_id=None, psm=6):
+    """
+    Perform OCR only on the given regions of the page and return an OcrDocument like
+    ocr_image_with_custom_line_detection, with every box in page pixels.
+
+    `regions` are (x1, y1, x2, y2) page rectangles; overlapping ones are merged first.
+    Crops are OCR'd as a single block of text (`psm` 6) since they hold a few lines at
+    most; with an engine they run in parallel.
+    """
+    def span(stage):
+        return metrics.span(stage, request_id) if metrics is not None else nullcontext()
+
+    crops = [(region, image.image.crop(region)) for region in merge_regions(regions)]
+    with span("ocr"):
+        if engine is not None:
+            futures = [engine.submit(crop, psm=psm) for _, crop in crops]
+            parts = [future.result() for future in futures]
+        else:
+            parts = [_run_tesseract(crop, psm=psm) for _, crop in crops]
+    parts = [map_ocr_data_to_page(part, 1.0, region[0], region[1]) for (region, _), part in zip(crops, parts)]
+
+    with span("group_words_into_lines"):
+        return OcrDocument.from_ocr_data(concatenate_ocr_data(parts), image.width, image.height)
+
 # Example usage
 if __name__ == '__main__':
+    from image import decode_image
+
     image_path = ''  # Replace with your image path
-    ocr_result = ocr_image_with_custom_line_detection(image_path, save_ocr=True)
+    with open(image_path, "rb") as image_file:
+        image = decode_image(base64.b64encode(image_file.read()))
+    ocr_result = ocr_image_with_custom_line_detection(image, save_ocr=True)
     # print(ocr_result)
@@ -0,0 +1,229 @@
+import json
+import shlex
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+OCR_DATA_KEYS = (
+    "level", "page_num", "block_num", "par_num", "line_num", "word_num",
+    "left", "top", "width", "height", "conf", "text",
+)
+
+# Tesseract handle owned by the current worker process, created once by _init_worker
+_api = None
+_worker_settings = {}
+
+
+class EngineBusyError(RuntimeError):
+    """Raised when the OCR queue stays full for longer than the caller is willing to wait."""
+
+
+class CancelToken():
+    """
+    Shared by the OCR jobs of one page. Cancelling it cancels those that haven't started on a worker yet
+    and makes later submissions fail with concurrent.futures.CancelledError.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def add(self, future):
+        with self._lock:
+            if self.cancelled:
+                future.cancel()
+            else:
+                self._futures.append(future)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.cancel()
+
+
+def load_tesseract_config(path):
+    """
+    Reads a Tesseract configuration written by `python neurons/benchmark.py tesseract`.
+
+    Returns:
+        dict: The `psm`, `oem` and `variables` keyword arguments of TesseractPool.
+    """
+    with open(path) as config_file:
+        config = json.load(config_file)
+    return {"psm": config.get("psm"), "oem": config.get("oem"), "variables": config.get("variables") or {}}
+
+
+def _init_worker(lang, psm, oem, variables=None):
+    global _api, _worker_settings
+    _worker_settings = {"lang": lang, "psm": psm, "oem": oem, "variables": variables or {}}
+    if tesserocr is not None:
+        _api = tesserocr.PyTessBaseAPI(lang=lang, init=False)
+        init_kwargs = {"lang": lang, "variables": {key: str(value) for key, value in (variables or {}).items()}}
+        if oem is not None:
+            init_kwargs["oem"] = oem
+        # Loading traindata is the expensive part, it happens once per worker instead of once per image.
+        # Dictionary variables (load_*_dawg) only take effect when passed at init time.
+        _api.InitFull(**init_kwargs)
+        if psm is not None:
+            _api.SetPageSegMode(psm)
+
+
+def _tesserocr_image_to_data(image):
+    """Runs the worker's Tesseract handle and lays the words out like pytesseract's Output.DICT."""
+    ocr_data = {key: [] for key in OCR_DATA_KEYS}
+    _api.SetImage(image)
+    _api.Recognize()
+    iterator = _api.GetIterator()
+    if iterator is None:
+        return ocr_data
+
+    ril = tesserocr.RIL
+    block_num = par_num = line_num = word_num = 0
+    for word in tesserocr.iterate_level(iterator, ril.WORD):
+        if word.IsAtBeginningOf(ril.BLOCK):
+            block_num, par_num, line_num = block_num + 1, 0, 0
+        if word.IsAtBeginningOf(ril.PARA):
+            par_num, line_num = par_num + 1, 0
+        if word.IsAtBeginningOf(ril.TEXTLINE):
+            line_num, word_num = line_num + 1, 0
+        word_num += 1
+
+        bbox = word.BoundingBox(ril.WORD)
+        if bbox is None:
+            continue
+        x1, y1, x2, y2 = bbox
+        values = (5, 1, block_num, par_num, line_num, word_num,
+                  x1, y1, x2 - x1, y2 - y1, word.Confidence(ril.WORD), word.GetUTF8Text(ril.WORD) or "")
+        for key, value in zip(OCR_DATA_KEYS, values):
+            ocr_data[key].append(value)
+    return ocr_data
+
+
+def _worker_image_to_data(image, psm=None):
+    if _api is not None:
+        if psm is None:
+            return _tesserocr_image_to_data(image)
+        default_psm = _api.GetPageSegMode()
+        _api.SetPageSegMode(psm)
+        try:
+            return _tesserocr_image_to_data(image)
+        finally:
+            _api.SetPageSegMode(default_psm)
+    # tesserocr isn't installed, fall back to the tesseract CLI through pytesseract
+    config = ""
+    psm = psm if psm is not None else _worker_settings.get("psm")
+    if psm is not None:
+        config += f" --psm {psm}"
+    if _worker_settings.get("oem") is not None:
+        config += f" --oem {_worker_settings['oem']}"
+    for key, value in _worker_settings.get("variables", {}).items():
+        # pytesseract splits the config with shlex, whitelists may hold quotes
+        config += f" -c {shlex.quote(f'{key}={value}')}"
+    return pytesseract.image_to_data(
+        image, lang=_worker_settings.get("lang", "eng"), config=config.strip(), output_type=pytesseract.Output.DICT
+    )
+
+
+class TesseractPool():
+    """
+    OCR engine backed by long-lived worker processes, each holding an initialized Tesseract handle.
+
+    Requests beyond `num_workers + max_queue` wait for a free slot for at most `queue_timeout`
+    seconds and then fail with EngineBusyError, so a burst can't pile up unbounded work.
+    Results have the same shape as `pytesseract.image_to_data(..., output_type=Output.DICT)`.
+
+    `psm` and `oem` select Tesseract's page segmentation and engine modes, `variables` sets Tesseract
+    parameters such as `load_system_dawg` or `tessedit_char_whitelist`.
+
+    tesserocr is used when it is installed; otherwise workers call the tesseract binary through pytesseract.
+
+    A worker dying (e.g. killed for memory on a huge page) breaks the whole executor: the requests in flight
+    fail with BrokenProcessPool and the next `submit` starts a fresh pool.
+    """
+
+    def __init__(self, num_workers=2, max_queue=16, queue_timeout=30.0, lang="eng", psm=None, oem=None,
+                 variables=None):
+        self.num_workers = num_workers
+        self.queue_timeout = queue_timeout
+        self._initargs = (lang, psm, oem, variables)
+        self._slots = threading.BoundedSemaphore(num_workers + max_queue)
+        self._restart_lock = threading.Lock()
+        if tesserocr is None:
+            logging.warning(
+                "tesserocr is not installed, OCR workers fall back to one tesseract process per image "
+                "through pytesseract: pip install tesserocr"
+            )
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        # spawn rather than fork: the miner process runs several threads by the time OCR starts
+        return ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+
+    def _restart(self, broken):
+        """Replaces the executor `broken` by a new one, unless another thread already did."""
+        with self._restart_lock:
+            if self._executor is broken:
+                logging.warning("An OCR worker died, restarting the Tesseract pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+            return self._executor
+
+    def submit(self, image, psm=None, cancel_token=None):
+        """
+        Queues a PIL image for OCR and returns a concurrent.futures.Future of its OCR data.
+        `psm` overrides the pool's page segmentation mode for this image only. The job is cancelled
+        with `cancel_token` (a CancelToken) if it is still queued then.
+        """
+        if cancel_token is not None and cancel_token.cancelled:
+            raise CancelledError("OCR cancelled")
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise EngineBusyError("OCR queue is full")
+        try:
+            executor = self._executor
+            try:
+                future = executor.submit(_worker_image_to_data, image, psm)
+            except BrokenProcessPool:
+                future = self._restart(executor).submit(_worker_image_to_data, image, psm)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        if cancel_token is not None:
+            cancel_token.add(future)
+        return future
+
+    def warmup(self):
+        """
+        Starts the workers up front by submitting one blank-image job per worker, so their Tesseract
+        handles are loaded before the first real request.
+        """
+        blank = Image.new("L", (64, 64), 255)
+        futures = [self._executor.submit(_worker_image_to_data, blank) for _ in range(self.num_workers)]
+        for future in futures:
+            future.result()
+
+    def image_to_data(self, image, psm=None, cancel_token=None):
+        """Blocking OCR of a PIL image, equivalent to `pytesseract.image_to_data` with Output.DICT."""
+        return self.submit(image, psm, cancel_token).result()
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -10,55 +10,104 @@ import json
 import base64
 import uuid
 
-class YoloCheckboxDetector():
+from document import OcrDocument, LineIndex, POLYGON_CORNERS
+from geometry import polygons_to_xyxy, non_max_suppression, cluster_starts
+
+
+class AssociationContext():
+    """
+    Per-document state of one YoloCheckboxDetector run, so a single detector can serve concurrent requests.
+
+    Attributes:
+        document (OcrDocument): The OCR'd page.
+        request_id (str): Identifier of the request, used in logs.
+        line_boxes (list): 8-point line boxes as plain lists. nearest_text_loop may narrow them,
+            the document itself is never modified.
+        line_texts (list): Text of each line.
+        checkbox_boxes (np.ndarray): (N, 4) x1, y1, x2, y2 boxes of every detected checkbox, selected or not,
+            used to tell a label's continuation lines from the labels of other checkboxes.
+        checkbox_index (LineIndex): The same y-sorted index as the document's lines, over `checkbox_boxes`.
+        max_checkbox_height (float): Height of the tallest detected checkbox, bounds the index queries.
+    """
+
+    def __init__(self, document, request_id="", checkbox_boxes=None):
+        self.document = document
+        self.request_id = request_id if request_id else str(uuid.uuid4())
+        self.line_boxes = document.line_polygons().tolist()
+        self.line_texts = document.line_texts()
+        self.checkbox_boxes = checkbox_boxes if checkbox_boxes is not None else np.empty((0, 4))
+        self.checkbox_index = LineIndex(self.checkbox_boxes)
+        self.max_checkbox_height = float(np.max(self.checkbox_boxes[:, 3] - self.checkbox_boxes[:, 1], initial=0))
 
-    def __init__(self):
-        self.lines_list = None
-        self.request_id = ""
 
-    def reduce_image_dimension(self, image):
-        try:
-            # Resize the image
-            maximum_acceptable_size = 9990
-            height, width = image.shape[:2]
-            scaling_factor = min(maximum_acceptable_size / height, maximum_acceptable_size / width)
-            new_height = int(height * scaling_factor)
-            new_width = int(width * scaling_factor)
-            resized_image = cv2.resize(image, (new_width, new_height))
-            
-            # Encode the resized image as bytes
-            _, encoded_image = cv2.imencode('.png', resized_image)
-            
-            return encoded_image.tobytes()
-        except Exception as e:
-            logging.error(f"Error in image size reduction: {e}")
-            return None
+class YoloCheckboxDetector():
+    """
+    Matches the selected checkboxes found by the detector with the OCR line that labels them.
+
+    Instances hold configuration only, every call works on its own AssociationContext: one detector is
+    created per miner and shared by all requests and threads.
+    """
+
+    # Window around a checkbox in which nearest_text_loop looks for its label
+    Y_MARGIN_ABOVE = 15
+    Y_MARGIN_BELOW = 10
+    X_MARGIN_RIGHT = 60
+    X_MARGIN_LEFT = 20
+
+    # Checkboxes compared at once by get_associated_text_matrix, bounds its distance matrices
+    MATRIX_CHUNK_SIZE = 256
+
+    # Multi-line labels: a line continues the label above it when it starts within CONTINUATION_X_TOLERANCE
+    # pixels of the label's left edge, at most CONTINUATION_GAP line heights below it, and no checkbox of its
+    # own claims it. Labels span at most MAX_LABEL_LINES lines.
+    CONTINUATION_X_TOLERANCE = 20
+    CONTINUATION_GAP = 1.0
+    MAX_LABEL_LINES = 3
+
+    # Labels left of their checkbox (nearest_text_loop_at_left) end between these many pixels left of its
+    # left edge and these many pixels right of it
+    LEFT_LABEL_X_MARGIN_LEFT = 60
+    LEFT_LABEL_X_MARGIN_RIGHT = 5
+
+    # Checkboxes whose horizontal centers are more than this many pixels apart belong to different columns
+    COLUMN_GAP = 80
+
+    def __init__(self, association_engine="loop", confidence_threshold=0.3, nms_threshold=0.5, nms_method="min",
+                 multiline=False):
+        """
+        `association_engine` picks how checkboxes are matched to text lines: "loop" runs nearest_text_loop per
+        checkbox, "matrix" evaluates every checkbox against every line at once with get_associated_text_matrix,
+        "columns" decides per column of checkboxes whether labels are on their left or right with
+        get_associated_text_columns.
+        Checkboxes detected with a confidence at or below `confidence_threshold` are dropped.
+        Detections overlapping a more confident one by more than `nms_threshold` are duplicates and dropped,
+        the overlap being measured like isOverlapping with `nms_method`. 0 keeps every detection.
+        With `multiline`, labels wrapping onto the following lines are assembled by add_continuation_lines.
+        """
+        self.association_engine = association_engine
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.nms_method = nms_method
+        self.multiline = multiline
 
-    def check_image_validity_for_ocr(self, file_content):
-        try:
-            maximum_acceptable_size = 10000
-            
-            # Read image from bytes
-            image = cv2.imdecode(np.frombuffer(file_content, np.uint8), -1)
-            img_height, img_width = image.shape[:2]
-            
-            if img_height < 50 or img_width < 50:
-                logging.error("Image is smaller than required size (50x50)")
-                return file_content, True
-            
-            if img_height > maximum_acceptable_size or img_width > maximum_acceptable_size:
-                resized_image_bytes = self.reduce_image_dimension(image)
-                if resized_image_bytes is not None:
-                    return resized_image_bytes, False
-            return file_content, False
-        except Exception as e:
-            logging.error("Error in image validity check: ", e)
-            return file_content, False
+    def suppress_duplicate_checkboxes(self, checkbox_response):
+        """
+        Drops duplicate detections of the same checkbox, whatever their state, keeping the most confident one.
+        The remaining predictions keep their original order.
+        """
+        if not self.nms_threshold or len(checkbox_response) < 2:
+            return checkbox_response
+        boxes = polygons_to_xyxy([checkbox.get('boundingBox', checkbox.get('polygon')) for checkbox in checkbox_response])
+        scores = [checkbox.get('confidence', 0.0) for checkbox in checkbox_response]
+        keep = np.sort(non_max_suppression(boxes, scores, self.nms_threshold, self.nms_method))
+        return [checkbox_response[i] for i in keep]
 
     def get_selected_checkboxes(self, checkbox_response):
         selected_checkboxes = []
         for checkbox in checkbox_response:
             if checkbox['state'] == 'selected':
+                # The predictions may be shared with other requests, only copies are modified
+                checkbox = dict(checkbox)
                 if 'polygon' in checkbox.keys():
                     checkbox["boundingBox"] = checkbox.pop("polygon")
                     if 'span' in checkbox.keys():
@@ -67,6 +116,45 @@ class YoloCheckboxDetector():
 
         return selected_checkboxes
 
+    def get_candidate_checkboxes(self, checkbox_response):
+        """
+        Returns copies of the selected checkboxes that pass the confidence screen, i.e. those that can end up
+        in the answer once a label is found. An empty list means the page needs no OCR at all.
+        """
+        checkboxes = self.get_selected_checkboxes(self.suppress_duplicate_checkboxes(checkbox_response))
+        return self.screen_checkboxes_based_on_confidence(checkboxes)
+
+    def get_text_search_regions(self, checkbox_response, width, height, padding=5, label_width=None):
+        """
+        Returns the page rectangles (x1, y1, x2, y2) where the labels of the selected checkboxes can be found,
+        i.e. the band nearest_text_loop searches, running from the checkbox to the right edge of the page,
+        or `label_width` pixels past the checkbox when given. With the "columns" engine labels may also be on
+        the left, so the band runs as far left of the checkbox, down to the left edge of the page by default.
+        With `multiline`, the band also runs below the checkbox over the MAX_LABEL_LINES - 1 lines a label can
+        wrap onto, taking the checkbox's height for the height of a line. The predictions are not modified.
+        """
+        regions = []
+        for checkbox in checkbox_response:
+            if checkbox.get('state') != 'selected':
+                continue
+            bbox = checkbox.get('boundingBox', checkbox.get('polygon'))
+            if not bbox:
+                continue
+            left_margin = self.X_MARGIN_LEFT
+            below = 0
+            if self.multiline:
+                line_height = max(bbox[1::2]) - min(bbox[1::2])
+                below = (self.MAX_LABEL_LINES - 1) * line_height * (1 + self.CONTINUATION_GAP)
+            if self.association_engine == "columns":
+                left_margin = self.LEFT_LABEL_X_MARGIN_LEFT + label_width if label_width else float('inf')
+            regions.append((
+                int(max(min(bbox[::2]) - left_margin - padding, 0)),
+                max(int(min(bbox[1::2])) - self.Y_MARGIN_ABOVE - padding, 0),
+                min(int(max(bbox[::2])) + label_width, width) if label_width else width,
+                min(int(max(bbox[1::2]) + self.Y_MARGIN_BELOW + padding + below), height),
+            ))
+        return regions
+
     def strip_string_at_left_of_checkbox(self, text_string, x1_text, x1_checkbox, x2_text):
         """When the text line lies at the left as well as at the right side of checkbox, this function will strip it out
         and discard its left part
@@ -89,10 +177,12 @@ class YoloCheckboxDetector():
 
         return stripped_text_string
 
-    def screen_checkboxes_based_on_confidence(self, checkboxes_with_text, threshold_conf = 0.3):
+    def screen_checkboxes_based_on_confidence(self, checkboxes_with_text, threshold_conf=None):
         """
         This function will select checkboxes along with the text with confidence greater than a threshold
         """
+        if threshold_conf is None:
+            threshold_conf = self.confidence_threshold
         new_checkboxes_list = []
         for each_checkbox in checkboxes_with_text:
             if each_checkbox["confidence"]>threshold_conf:
@@ -102,18 +192,27 @@ class YoloCheckboxDetector():
 
 
     def convert_ocr_to_line_list(self, model_request_data):
+        """Returns the OCR result as an OcrDocument, converting it when it is in the dict form of OcrDocument.to_dict."""
+        if isinstance(model_request_data, OcrDocument):
+            return model_request_data
         try:
-            lines = model_request_data.get('lines', [])
-            return lines
+            return OcrDocument.from_dict(model_request_data)
 
         except Exception as e:
             logging.error(f"Error in convert_ocr_to_line_list: {e}")
-            return []
+            return OcrDocument.empty()
 
-    def nearest_text_loop(self, checkbox_bbox, lines_list):
+    def nearest_text_loop(self, checkbox_bbox, line_boxes, line_texts, candidates=None, return_index=False):
+        """
+        Returns the text and box of the line nearest to the checkbox among those within the margins,
+        looking to its right and below first. `candidates` restricts the search to these line indices,
+        given in ascending order; all lines are scanned when it is None. With `return_index`, the index
+        of the line (or None) is returned as well.
+        """
         # Initialize variables to store the nearest text and its distance
         nearest_text = None
         nearest_text_bbox = None
+        nearest_index = None
         min_distance = float('inf')  # Initialize with a large value
 
         # Calculate the center coordinates of the checkbox
@@ -121,15 +220,15 @@ class YoloCheckboxDetector():
         checkbox_center_y = (checkbox_bbox[1] + checkbox_bbox[5]) / 2
 
         # defining thresholds for top, bottom, left and right
-        y_margin_above = 15
-        y_margin_below = 10
-        x_margin_right = 60
-        x_margin_left = 20
+        y_margin_above = self.Y_MARGIN_ABOVE
+        y_margin_below = self.Y_MARGIN_BELOW
+        x_margin_right = self.X_MARGIN_RIGHT
+        x_margin_left = self.X_MARGIN_LEFT
 
         # Iterate through each text bounding box
-        for ind, content in enumerate(lines_list):
+        for ind in (range(len(line_boxes)) if candidates is None else candidates):
             strip_string = False
-            text_bbox = lines_list[ind]["boundingBox"]
+            text_bbox = line_boxes[ind]
             # Calculate the center coordinates of the text bounding box
             text_center_x = (text_bbox[0] + text_bbox[2]) / 2
             text_center_y = (text_bbox[1] + text_bbox[5]) / 2
@@ -151,46 +250,47 @@ class YoloCheckboxDetector():
                         # Check if this text is closer than the current nearest text
                         if distance > 0.5 and distance < min_distance:
                             min_distance = distance
-                            nearest_text = lines_list[ind]["text"]
+                            nearest_text = line_texts[ind]
                             if strip_string:
                                 nearest_text = self.strip_string_at_left_of_checkbox(nearest_text, text_bbox[0], checkbox_bbox[0], text_bbox[2])
                                 text_bbox[0], text_bbox[6] = checkbox_bbox[0], checkbox_bbox[6]
                             nearest_text_bbox = text_bbox
+                            nearest_index = ind
         if nearest_text:
             nearest_text = nearest_text.lstrip("X").lstrip("x")
+        if return_index:
+            return nearest_text, nearest_text_bbox, nearest_index
         return nearest_text, nearest_text_bbox
 
 
-    def nearest_text_loop_at_left(self, checkbox_bbox, lines_list, left_right_clusters):
+    def nearest_text_loop_at_left(self, checkbox_bbox, line_boxes, line_texts, candidates=None, return_index=False):
+        """
+        Counterpart of nearest_text_loop for labels written left of their checkbox: returns the text and box of
+        the nearest line ending just before the checkbox, looking to its left and above first. `candidates` and
+        `return_index` work as in nearest_text_loop.
+        """
         # Initialize variables to store the nearest text and its distance
         nearest_text = None
         nearest_text_bbox = None
+        nearest_index = None
         min_distance = float('inf')  # Initialize with a large value
 
         # Calculate the center coordinates of the checkbox
         checkbox_center_x = (checkbox_bbox[0] + checkbox_bbox[2]) / 2
         checkbox_center_y = (checkbox_bbox[1] + checkbox_bbox[5]) / 2
 
-        # defining thresholds for top, bottom, left and right
-        y_margin_above = 15
-        y_margin_below = 10
-        x_margin_right = 5
-        x_margin_left = 60
         # Iterate through each text bounding box
-        for ind, content in enumerate(lines_list):
-            strip_string = False
-            text_bbox = lines_list[ind]["boundingBox"]
+        for ind in (candidates if candidates is not None else range(len(line_boxes))):
+            text_bbox = line_boxes[ind]
             # Calculate the center coordinates of the text bounding box
             text_center_x = (text_bbox[0] + text_bbox[2]) / 2
             text_center_y = (text_bbox[1] + text_bbox[5]) / 2
 
             # if text lies vertically within the range of checkbox
-            if ((checkbox_bbox[1] - y_margin_above) < text_bbox[1]) and ((checkbox_bbox[7] + y_margin_below) > text_bbox[7]):
-                # if text lies horizontally within the range of checkbox
-                if ((checkbox_bbox[0] + x_margin_right) > text_bbox[2]) and ((checkbox_bbox[0] - x_margin_left) < text_bbox[2]):
-                # if text lies horizontally at the left as well as at the right side of checkbox
-
-                    # Check if the text is to the right or below the checkbox
+            if ((checkbox_bbox[1] - self.Y_MARGIN_ABOVE) < text_bbox[1]) and ((checkbox_bbox[7] + self.Y_MARGIN_BELOW) > text_bbox[7]):
+                # if text ends horizontally just before the checkbox
+                if ((checkbox_bbox[0] + self.LEFT_LABEL_X_MARGIN_RIGHT) > text_bbox[2]) and ((checkbox_bbox[0] - self.LEFT_LABEL_X_MARGIN_LEFT) < text_bbox[2]):
+                    # Check if the text is to the left or above the checkbox
                     if text_center_x < checkbox_center_x or text_center_y <= checkbox_center_y:
                         # Calculate the Euclidean distance between the checkbox and text center
                         distance = ((checkbox_center_x - text_center_x) ** 2 +
@@ -198,30 +298,232 @@ class YoloCheckboxDetector():
                         # Check if this text is closer than the current nearest text
                         if distance > 0.5 and distance < min_distance:
                             min_distance = distance
-                            nearest_text = lines_list[ind]["text"]
-                            if self.use_spacing_method:
-                                nearest_text, nearest_text_bbox = self.check_on_word_level(lines_list, ind, checkbox_bbox, nearest_text, text_bbox)
-                            if nearest_text is None or nearest_text=="":
-                                nearest_text = lines_list[ind]["text"]
+                            nearest_text = line_texts[ind]
                             nearest_text_bbox = text_bbox
-
+                            nearest_index = ind
+        if nearest_text:
+            nearest_text = nearest_text.rstrip("X").rstrip("x").rstrip()
+        if return_index:
+            return nearest_text, nearest_text_bbox, nearest_index
         return nearest_text, nearest_text_bbox
 
-    def get_associated_text(self, checkboxes_list):
+    def label_gaps(self, context, checkbox_box):
+        """
+        Horizontal gaps in pixels between an x1, y1, x2, y2 checkbox and the nearest line that could be its
+        label on the right and on the left, inf when there is none. Lines come from the document's line index.
+        """
+        x1, y1, x2, y2 = checkbox_box
+        candidates = context.document.line_index.lines_starting_between(y1 - self.Y_MARGIN_ABOVE, y2 + self.Y_MARGIN_BELOW)
+        lines = context.document.line_boxes[candidates]
+        lines = lines[lines[:, 3] < y2 + self.Y_MARGIN_BELOW]
+        right = lines[((x1 - self.X_MARGIN_LEFT) < lines[:, 0]) & ((x2 + self.X_MARGIN_RIGHT) > lines[:, 0])]
+        left = lines[((x1 + self.LEFT_LABEL_X_MARGIN_RIGHT) > lines[:, 2]) & ((x1 - self.LEFT_LABEL_X_MARGIN_LEFT) < lines[:, 2])]
+        right_gap = np.clip(right[:, 0] - x2, 0, None).min() if len(right) else np.inf
+        left_gap = np.clip(x1 - left[:, 2], 0, None).min() if len(left) else np.inf
+        return right_gap, left_gap
+
+    def get_label_sides(self, context, checkbox_boxes):
+        """
+        Clusters the x1, y1, x2, y2 checkbox boxes of a page into columns by their horizontal center and picks the
+        side of the labels of each column: every checkbox votes for the side whose nearest candidate line is closer,
+        and the right side wins ties.
+
+        Returns:
+            tuple: The sorted left-most center of each column and whether its labels are on the left, one per column.
+        """
+        centers = (checkbox_boxes[:, 0] + checkbox_boxes[:, 2]) / 2
+        column_starts = cluster_starts(centers, self.COLUMN_GAP)
+        columns = np.searchsorted(column_starts, centers, side="right") - 1
+        votes = np.zeros(len(column_starts), dtype=np.int64)
+        for column, box in zip(columns.tolist(), checkbox_boxes.tolist()):
+            right_gap, left_gap = self.label_gaps(context, box)
+            if left_gap < right_gap:
+                votes[column] += 1
+            elif right_gap < left_gap:
+                votes[column] -= 1
+        return column_starts, (votes > 0).tolist()
+
+    def get_associated_text_columns(self, context, checkboxes_list):
+        """
+        Column-aware association for forms with labels left of their checkboxes or several columns of checkboxes.
+        The label side is decided once per column with get_label_sides, over every detected checkbox of the page,
+        then each checkbox looks its label up on that side among the lines of the line index in its vertical window.
+        """
+        if not checkboxes_list:
+            return []
+        checkbox_boxes = context.checkbox_boxes
+        if not len(checkbox_boxes):
+            checkbox_boxes = polygons_to_xyxy([checkbox["boundingBox"] for checkbox in checkboxes_list])
+        column_starts, at_left = self.get_label_sides(context, checkbox_boxes)
+
         checkboxes_with_text = []
-        i = 1
         for checkboxes in checkboxes_list:
-            print("Check Boxes:", i)
-            nearest_text, nearest_text_bbox = self.nearest_text_loop(checkboxes["boundingBox"], self.lines_list)
+            checkbox_bbox = checkboxes["boundingBox"]
+            center_x = (min(checkbox_bbox[::2]) + max(checkbox_bbox[::2])) / 2
+            column = max(np.searchsorted(column_starts, center_x, side="right") - 1, 0)
+            candidates = context.document.line_index.lines_starting_between(
+                checkbox_bbox[1] - self.Y_MARGIN_ABOVE, checkbox_bbox[7] + self.Y_MARGIN_BELOW
+            ).tolist()
+            side = "left" if at_left[column] else "right"
+            nearest = self.nearest_text_loop_at_left if side == "left" else self.nearest_text_loop
+            nearest_text, nearest_text_bbox, ind = nearest(
+                checkbox_bbox, context.line_boxes, context.line_texts, candidates, return_index=True
+            )
+            if nearest_text and self.multiline:
+                nearest_text, nearest_text_bbox = self.add_continuation_lines(
+                    context, checkbox_bbox, ind, nearest_text, nearest_text_bbox, side
+                )
             if nearest_text:
                 checkboxes["text"] = nearest_text
                 checkboxes["checkbox_boundingBox"] = checkboxes["boundingBox"]
                 checkboxes["boundingBox"] = nearest_text_bbox
                 checkboxes_with_text.append(checkboxes)
-            i+=1
 
         return checkboxes_with_text
-    
+
+    def get_associated_text(self, context, checkboxes_list, use_index=True):
+        checkboxes_with_text = []
+        for checkboxes in checkboxes_list:
+            candidates = None
+            if use_index:
+                # Only lines starting inside the checkbox's vertical window can pass the margin test,
+                # which only ever moves left edges, so the index stays valid
+                checkbox_bbox = checkboxes["boundingBox"]
+                candidates = context.document.line_index.lines_starting_between(
+                    checkbox_bbox[1] - self.Y_MARGIN_ABOVE, checkbox_bbox[7] + self.Y_MARGIN_BELOW
+                ).tolist()
+            nearest_text, nearest_text_bbox, ind = self.nearest_text_loop(
+                checkboxes["boundingBox"], context.line_boxes, context.line_texts, candidates, return_index=True
+            )
+            if nearest_text and self.multiline:
+                nearest_text, nearest_text_bbox = self.add_continuation_lines(
+                    context, checkboxes["boundingBox"], ind, nearest_text, nearest_text_bbox
+                )
+            if nearest_text:
+                checkboxes["text"] = nearest_text
+                checkboxes["checkbox_boundingBox"] = checkboxes["boundingBox"]
+                checkboxes["boundingBox"] = nearest_text_bbox
+                checkboxes_with_text.append(checkboxes)
+
+        return checkboxes_with_text
+
+    def get_associated_text_matrix(self, context, checkboxes_list):
+        """
+        Same association as get_associated_text, computed for all checkboxes at once with numpy: the margin
+        tests, the right/below preference and the distances form checkbox x line matrices and each checkbox
+        takes the eligible line at the smallest distance (the first one on ties, like the loop).
+
+        The left strip is only applied to the winning lines, so unlike the loop a line stripped for one
+        checkbox keeps its full width for the next ones.
+        """
+        if not checkboxes_list:
+            return []
+        document = context.document
+        lines = document.line_polygons().astype(np.float64)
+        text_x1, text_y1, text_x2, text_y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 7]
+        text_center_x = (lines[:, 0] + lines[:, 2]) / 2
+        text_center_y = (lines[:, 1] + lines[:, 5]) / 2
+
+        winners = []
+        for start in range(0, len(checkboxes_list), self.MATRIX_CHUNK_SIZE):
+            chunk = checkboxes_list[start:start + self.MATRIX_CHUNK_SIZE]
+            boxes = np.array([checkbox["boundingBox"] for checkbox in chunk], dtype=np.float64)
+            # Column vectors, broadcast against the line rows
+            x1, y1, x2, y2 = boxes[:, 0:1], boxes[:, 1:2], boxes[:, 2:3], boxes[:, 7:8]
+            center_x = (boxes[:, 0:1] + boxes[:, 2:3]) / 2
+            center_y = (boxes[:, 1:2] + boxes[:, 5:6]) / 2
+
+            vertical = ((y1 - self.Y_MARGIN_ABOVE) < text_y1) & ((y2 + self.Y_MARGIN_BELOW) > text_y2)
+            spans_checkbox = (text_x1 < x1) & (text_x2 > x1)
+            horizontal = (((x1 - self.X_MARGIN_LEFT) < text_x1) & ((x2 + self.X_MARGIN_RIGHT) > text_x1)) | spans_checkbox
+            right_or_below = (text_center_x >= center_x) | (text_center_y >= center_y)
+            distance = np.sqrt((center_x - text_center_x) ** 2 + (center_y - text_center_y) ** 2)
+            distance = np.where(vertical & horizontal & right_or_below & (distance > 0.5), distance, np.inf)
+
+            nearest = distance.argmin(axis=1)
+            found = np.isfinite(distance[np.arange(len(chunk)), nearest])
+            strip = spans_checkbox[np.arange(len(chunk)), nearest]
+            winners.extend(zip(chunk, nearest.tolist(), found.tolist(), strip.tolist()))
+
+        line_boxes = document.line_polygons()
+        checkboxes_with_text = []
+        for checkboxes, ind, found, strip in winners:
+            if not found:
+                continue
+            checkbox_bbox = checkboxes["boundingBox"]
+            nearest_text = document.line_text(ind)
+            nearest_text_bbox = line_boxes[ind].tolist()
+            if strip:
+                nearest_text = self.strip_string_at_left_of_checkbox(nearest_text, nearest_text_bbox[0], checkbox_bbox[0], nearest_text_bbox[2])
+                nearest_text_bbox[0], nearest_text_bbox[6] = checkbox_bbox[0], checkbox_bbox[6]
+            nearest_text = nearest_text.lstrip("X").lstrip("x")
+            if nearest_text and self.multiline:
+                nearest_text, nearest_text_bbox = self.add_continuation_lines(
+                    context, checkbox_bbox, ind, nearest_text, nearest_text_bbox
+                )
+            if nearest_text:
+                checkboxes["text"] = nearest_text
+                checkboxes["checkbox_boundingBox"] = checkboxes["boundingBox"]
+                checkboxes["boundingBox"] = nearest_text_bbox
+                checkboxes_with_text.append(checkboxes)
+
+        return checkboxes_with_text
+
+    def is_claimed_by_checkbox(self, context, line_box, own_checkbox, side="right"):
+        """
+        Whether a line lies in the label window of a detected checkbox other than `own_checkbox`, i.e. starts an item
+        of its own. `line_box` and `own_checkbox` are x1, y1, x2, y2 boxes, `side` is the side of the labels.
+        """
+        x1, y1, x2, y2 = line_box
+        # The window of a checkbox spans its top - Y_MARGIN_ABOVE to its bottom + Y_MARGIN_BELOW, so only
+        # checkboxes starting in this range can contain the line
+        nearby = context.checkbox_index.lines_starting_between(
+            y2 - self.Y_MARGIN_BELOW - context.max_checkbox_height, y1 + self.Y_MARGIN_ABOVE
+        )
+        # Rarely more than a few checkboxes, plain Python beats numpy at this size
+        for box in context.checkbox_boxes[nearby].tolist():
+            if box == own_checkbox:
+                continue
+            if not ((box[1] - self.Y_MARGIN_ABOVE) < y1 and (box[3] + self.Y_MARGIN_BELOW) > y2):
+                continue
+            if side == "left":
+                if (box[0] - self.LEFT_LABEL_X_MARGIN_LEFT) < x2 < (box[0] + self.LEFT_LABEL_X_MARGIN_RIGHT):
+                    return True
+            elif (box[0] - self.X_MARGIN_LEFT) < x1 < (box[2] + self.X_MARGIN_RIGHT):
+                return True
+        return False
+
+    def add_continuation_lines(self, context, checkbox_bbox, ind, nearest_text, nearest_text_bbox, side="right"):
+        """
+        Extends the label found on line `ind` with the lines it wraps onto: lines starting at the same x below it,
+        looked up through the document's line index, until a gap, a misaligned line or another checkbox's label.
+        Returns the text and the box merged with merge_polygon_bbox.
+        """
+        document = context.document
+        boxes = document.line_boxes
+        own_checkbox = [min(checkbox_bbox[::2]), min(checkbox_bbox[1::2]), max(checkbox_bbox[::2]), max(checkbox_bbox[1::2])]
+        label_x1 = boxes[ind, 0]
+        current, used = ind, {ind}
+        current_box = boxes[ind].tolist()
+        for _ in range(self.MAX_LABEL_LINES - 1):
+            height = current_box[3] - current_box[1]
+            # Lines starting in the lower half of the current line or in the gap below it
+            nearby = document.line_index.lines_starting_between(
+                current_box[3] - height / 2, current_box[3] + height * self.CONTINUATION_GAP
+            )
+            candidates = [
+                (box, c) for c, box in zip(nearby.tolist(), boxes[nearby].tolist())
+                if c not in used and abs(box[0] - label_x1) <= self.CONTINUATION_X_TOLERANCE
+            ]
+            if not candidates:
+                break
+            current_box, current = min(candidates, key=lambda candidate: candidate[0][1])
+            if self.is_claimed_by_checkbox(context, current_box, own_checkbox, side):
+                break
+            used.add(current)
+            nearest_text = f"{nearest_text} {document.line_text(current)}"
+            nearest_text_bbox = self.merge_polygon_bbox(nearest_text_bbox, boxes[current, POLYGON_CORNERS].tolist())
+        return nearest_text, nearest_text_bbox
 
     def to_xyxy(self, bbox):
         box = [bbox[0], bbox[1], bbox[2], bbox[1], bbox[2], bbox[3], bbox[0], bbox[3]]
@@ -302,24 +604,32 @@ class YoloCheckboxDetector():
  
 
     def get_selected_checkboxes_with_text(self, checkbox_response, ocr_data, request_id=""):
-        self.request_id = request_id if request_id else str(uuid.uuid4())
         try:
-            self.lines_list = self.convert_ocr_to_line_list(ocr_data)
-            if len(self.lines_list) == 0:
+            document = self.convert_ocr_to_line_list(ocr_data)
+            if len(document) == 0:
                 logging.info("lines dataframe is empty in checkbox service")
                 return []
-
             # Since call_form_recognizer takes more time so this function is called in a thread
 
             # get selected checkboxes
-            checkboxes_response = self.get_selected_checkboxes(checkbox_response)
+            detections = self.suppress_duplicate_checkboxes(checkbox_response)
+            checkbox_boxes = None
+            if (self.multiline or self.association_engine == "columns") and detections:
+                checkbox_boxes = polygons_to_xyxy([checkbox.get('boundingBox', checkbox.get('polygon')) for checkbox in detections])
+            context = AssociationContext(document, request_id, checkbox_boxes)
+            checkboxes_response = self.get_selected_checkboxes(detections)
             # get text near selected checkboxes
-            checkboxes_with_text = self.get_associated_text(checkboxes_response)
+            if self.association_engine == "matrix":
+                checkboxes_with_text = self.get_associated_text_matrix(context, checkboxes_response)
+            elif self.association_engine == "columns":
+                checkboxes_with_text = self.get_associated_text_columns(context, checkboxes_response)
+            else:
+                checkboxes_with_text = self.get_associated_text(context, checkboxes_response)
             # filter out checkboxes based on confidence
             final_check_boxes = self.screen_checkboxes_based_on_confidence(checkboxes_with_text)
             return final_check_boxes
         except Exception as e:
-            logging.error(e)
+            logging.error(f"[{request_id}] {e}")
             return []
 
 
@@ -0,0 +1,123 @@
+import numpy as np
+from PIL import Image
+
+# Options of each preprocessing profile:
+#   grayscale:          convert to 8-bit grayscale, Tesseract binarizes internally anyway
+#   target_text_height: downscale so that the median text line is about this many pixels tall
+#                       (Tesseract is most accurate around 20-30 px), None keeps the resolution
+#   binarize:           apply a global Otsu threshold before OCR
+#   crop_borders:       drop the blank margins around the content
+PROFILES = {
+    "none": {"grayscale": False, "target_text_height": None, "binarize": False, "crop_borders": False},
+    "gray": {"grayscale": True, "target_text_height": None, "binarize": False, "crop_borders": False},
+    "fast": {"grayscale": True, "target_text_height": 30, "binarize": False, "crop_borders": True},
+    "fastest": {"grayscale": True, "target_text_height": 22, "binarize": True, "crop_borders": True},
+}
+
+# Pixels kept around the content when cropping borders
+CROP_MARGIN = 10
+
+
+class PreprocessedImage():
+    """
+    The image handed to Tesseract together with what is needed to map its boxes back to page pixels.
+
+    Attributes:
+        image (PIL.Image.Image): The preprocessed image.
+        scale (float): Resize factor applied to the page.
+        offset (tuple): Page position (x, y) of the image's top-left corner.
+    """
+
+    def __init__(self, image, scale=1.0, offset=(0, 0)):
+        self.image = image
+        self.scale = scale
+        self.offset = offset
+
+
+def otsu_threshold(gray):
+    """Returns the Otsu threshold of a uint8 grayscale array: the pixels darker than it are ink."""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight_background = np.cumsum(histogram)
+    weight_foreground = weight_background[-1] - weight_background
+    cumulative_mean = np.cumsum(histogram * np.arange(256))
+    mean_background = cumulative_mean / np.maximum(weight_background, 1)
+    mean_foreground = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_foreground, 1)
+    between_variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    # argmax is the last level of the dark class
+    return int(np.argmax(between_variance)) + 1
+
+
+def estimate_text_height(ink, strips=8):
+    """
+    Estimates the median height in pixels of the text lines of a page from its boolean ink mask,
+    using the runs of consecutive ink rows within vertical strips of the page. Returns None for blank pages.
+    """
+    height, width = ink.shape
+    # Vertical rules of tables and frames would join every row they cross into one run
+    ink = ink[:, ink.mean(axis=0) < 0.25]
+    heights = []
+    for strip in np.array_split(ink, strips, axis=1):
+        if not strip.size:
+            continue
+        rows = strip.any(axis=1).astype(np.int8)
+        edges = np.diff(np.concatenate(([0], rows, [0])))
+        heights.append(np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1))
+    heights = np.concatenate(heights) if heights else np.empty(0, dtype=np.int64)
+    # Ruling lines and specks are a row or two tall, pictures much taller than any text line
+    heights = heights[(heights > 3) & (heights < height / 10)]
+    if not heights.size:
+        return None
+    return float(np.median(heights))
+
+
+def content_box(ink, margin=CROP_MARGIN):
+    """Returns the (x1, y1, x2, y2) box around the ink of a page, padded by `margin`, or None for blank pages."""
+    rows, cols = np.flatnonzero(ink.any(axis=1)), np.flatnonzero(ink.any(axis=0))
+    if not rows.size:
+        return None
+    height, width = ink.shape
+    return (
+        max(int(cols[0]) - margin, 0), max(int(rows[0]) - margin, 0),
+        min(int(cols[-1]) + 1 + margin, width), min(int(rows[-1]) + 1 + margin, height),
+    )
+
+
+def preprocess_for_ocr(image, profile="none", scale=1.0):
+    """
+    Prepares a PIL image for Tesseract according to one of the PROFILES.
+
+    `scale` is an extra resize factor requested by the caller (e.g. the downscaled deadline tier),
+    applied on top of the profile's own. Text is never upscaled by the profile.
+
+    Returns:
+        PreprocessedImage: The image to OCR, its scale and its offset on the page.
+    """
+    options = PROFILES[profile]
+    if not any(options.values()) and scale == 1.0:
+        return PreprocessedImage(image)
+
+    offset = (0, 0)
+    if options["grayscale"] and image.mode != "L":
+        image = image.convert("L")
+    if options["binarize"] or options["crop_borders"] or options["target_text_height"]:
+        gray = np.asarray(image if image.mode == "L" else image.convert("L"))
+        ink = gray < otsu_threshold(gray)
+
+        if options["crop_borders"]:
+            box = content_box(ink)
+            if box is not None and box != (0, 0, image.width, image.height):
+                image = image.crop(box)
+                ink = ink[box[1]:box[3], box[0]:box[2]]
+                offset = box[:2]
+
+        if options["target_text_height"]:
+            text_height = estimate_text_height(ink)
+            if text_height:
+                scale *= min(options["target_text_height"] / text_height, 1.0)
+
+        if options["binarize"]:
+            image = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+
+    if scale != 1.0:
+        image = image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)))
+    return PreprocessedImage(image, scale, offset)
@@ -31,5 +31,6 @@ __spec_version__ = (
 from . import protocol
 from . import base
 from . import validator
+from . import miner
 from . import api
 from .subnet_links import SUBNET_LINKS
@@ -76,7 +76,7 @@ class BaseMinerNeuron(BaseNeuron):
 
         This function performs the following primary tasks:
         1. Check for registration on the Bittensor network.
-        2. Starts the miner's axon, making it active on the network.
+        2. Warms up the miner, then starts its axon, making it active on the network.
         3. Periodically resynchronizes with the chain; updating the metagraph with the latest network state and setting weights.
 
         The miner continues its operations until `should_exit` is set to True or an external interruption occurs.
@@ -103,6 +103,14 @@ class BaseMinerNeuron(BaseNeuron):
         )
         self.axon.serve(netuid=self.config.netuid, subtensor=self.subtensor)
 
+        # Pay cold-start costs before validators can reach us, so the first request sees steady-state latency.
+        # A failed warm-up only costs the first requests some latency, the axon is started regardless.
+        try:
+            self.warmup()
+        except Exception as e:
+            bt.logging.error(f"Warm-up failed, starting the axon anyway: {e!r}")
+            bt.logging.debug(traceback.format_exc())
+
         # Start  starts the miner's axon, making it active on the network.
         self.axon.start()
 
@@ -136,6 +144,13 @@ class BaseMinerNeuron(BaseNeuron):
         except Exception as e:
             bt.logging.error(traceback.format_exc())
 
+    def warmup(self):
+        """
+        Called by `run` right before the axon starts serving. Subclasses can override it to load models and
+        run a few requests through their pipeline, so that the first real request isn't a cold one.
+        """
+        pass
+
     def run_in_background_thread(self):
         """
         Starts the miner's operations in a separate background thread.
@@ -0,0 +1,6 @@
+from .cache import ResultCache
+from .singleflight import SingleFlight
+from .admission import AdmissionQueue, AdmissionRejected
+from .batching import MicroBatcher
+from .metrics import MinerMetrics, MetricsServer
+from .deadline import DeadlinePlanner
@@ -0,0 +1,138 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is turned away instead of being queued."""
+
+
+class AdmissionQueue:
+    """
+    Bounded work queue in front of the miner pipeline.
+
+    At most `max_inflight` documents are processed at once. Further requests wait in a queue of at
+    most `max_queue` entries and are admitted highest priority first (FIFO among equal priorities).
+    A request is rejected straight away when the queue is full, or when the estimated wait plus the
+    typical service time would not fit in its timeout, so it fails fast instead of timing out.
+
+    The service time estimate is an exponential moving average of the time spent holding a slot.
+    """
+
+    def __init__(self, max_inflight=4, max_queue=32, initial_service_time=5.0, alpha=0.2):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.alpha = alpha
+        self.service_time = initial_service_time
+        self.inflight = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.last_wait_time = 0.0
+        self.wait_time = 0.0  # moving average, in seconds
+        self._waiters = []
+        self._counter = itertools.count()
+
+    @property
+    def depth(self):
+        """Number of requests waiting for a slot."""
+        return len(self._waiters)
+
+    def estimated_wait(self, priority=0.0):
+        """Seconds a new request with this priority is expected to wait before it gets a slot."""
+        if self.inflight < self.max_inflight and not self._waiters:
+            return 0.0
+        ahead = sum(1 for waiter in self._waiters if -waiter[0] >= priority)
+        return (ahead // self.max_inflight + 1) * self.service_time
+
+    async def acquire(self, priority=0.0, timeout=None):
+        """
+        Waits for a processing slot.
+
+        Args:
+            priority (float): Higher values are served first, e.g. the caller's stake.
+            timeout (float): Seconds the caller can afford in total, waiting and processing included.
+
+        Raises:
+            AdmissionRejected: If the queue is full, the deadline can't be met, or it passed while waiting.
+        """
+        start = time.monotonic()
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            self._admit(start)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected(f"queue is full ({self.max_queue} waiting)")
+        if timeout is not None and self.estimated_wait(priority) + self.service_time > timeout:
+            self.rejected_deadline += 1
+            raise AdmissionRejected(f"estimated completion exceeds the {timeout}s deadline")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (-priority, next(self._counter), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            wait_budget = None if timeout is None else max(timeout - self.service_time, 0)
+            await asyncio.wait_for(asyncio.shield(future), wait_budget)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as we gave up, pass it on
+                self.release()
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected_deadline += 1
+                raise AdmissionRejected("deadline passed while waiting in the queue") from e
+            raise
+        self._admit(start)
+
+    def release(self, service_time=None):
+        """Frees a slot, handing it directly to the highest priority waiter if there is one."""
+        if service_time is not None:
+            self.service_time += self.alpha * (service_time - self.service_time)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot moves to the waiter, so `inflight` stays the same
+                future.set_result(None)
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority=0.0, timeout=None):
+        """`async with queue.slot(priority, timeout):` holds a processing slot for the duration of the block."""
+        await self.acquire(priority, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def _admit(self, start):
+        self.admitted += 1
+        self.last_wait_time = time.monotonic() - start
+        self.wait_time += self.alpha * (self.last_wait_time - self.wait_time)
@@ -0,0 +1,95 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Groups items submitted by concurrent requests into batches.
+
+    Items are collected until `max_batch_size` of them are pending or `max_wait` seconds have passed
+    since the first one arrived, then `batch_fn` is awaited once with the whole list. It must return
+    one result per item, in order; a result that is an Exception instance fails only its own item.
+    If `batch_fn` raises, every item of the batch fails with that error.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait=0.02):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._pending = []
+        self._timer = None
+        self._loop = None
+        self._tasks = set()
+
+    @property
+    def mean_batch_size(self):
+        return self.items / self.batches if self.batches else 0.0
+
+    async def submit(self, item):
+        """Adds an item to the next batch and returns its result once the batch has run."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Futures are bound to their loop, so anything pending on another loop is dropped
+            self._pending = []
+            self._timer = None
+            self._loop = loop
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._run(batch))
+            # Keep a reference so the task isn't garbage collected while running
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"batch_fn returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,145 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+import bittensor as bt
+
+
+class ResultCache:
+    """
+    Content-addressed cache for miner results.
+
+    Entries are stored as JSON strings, so every `get` hands out a fresh copy that callers are free
+    to mutate, and the memory cap is measured on the stored bytes. The least recently used entries
+    are evicted once `max_entries` or `max_bytes` is exceeded, and entries older than `ttl` seconds
+    are treated as misses.
+
+    If `persist_dir` is set, each entry is also written to `<persist_dir>/<key>.json` and reloaded
+    on start-up, so the cache survives a miner restart. Keys must therefore be valid file names.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=24 * 3600, persist_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persist_dir = persist_dir
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        # key -> (expires_at, serialized value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns a copy of the cached value, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            serialized = entry[1]
+        return json.loads(serialized)
+
+    def put(self, key, value):
+        serialized = json.dumps(value)
+        if len(serialized) > self.max_bytes:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, serialized)
+            self.size_bytes += len(serialized)
+            self._evict()
+        self._write(key, expires_at, serialized)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+        }
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, serialized = self._entries.pop(key)
+        self.size_bytes -= len(serialized)
+        if self.persist_dir:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, key):
+        return os.path.join(self.persist_dir, f"{key}.json")
+
+    def _write(self, key, expires_at, serialized):
+        if not self.persist_dir:
+            return
+        path = self._path(key)
+        try:
+            # Write to a temporary file first so a crash never leaves a truncated entry behind
+            with open(path + ".tmp", "w") as f:
+                f.write(f"{expires_at}\n{serialized}")
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            bt.logging.warning(f"Could not persist cache entry {key}: {e}")
+
+    def _load(self):
+        files = [f for f in os.listdir(self.persist_dir) if f.endswith(".json")]
+        files.sort(key=lambda f: os.path.getmtime(os.path.join(self.persist_dir, f)))
+        now = time.time()
+        for filename in files:
+            path = os.path.join(self.persist_dir, filename)
+            try:
+                with open(path) as f:
+                    expires_at, serialized = f.read().split("\n", 1)
+                expires_at = float(expires_at)
+            except (OSError, ValueError):
+                expires_at = 0
+            if expires_at < now:
+                os.remove(path)
+                continue
+            key = filename[: -len(".json")]
+            self._entries[key] = (expires_at, serialized)
+            self.size_bytes += len(serialized)
+        self._evict()
+        bt.logging.info(f"Loaded {len(self._entries)} cached results from {self.persist_dir}")
@@ -0,0 +1,93 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+# Processing tiers, from best answer to cheapest
+FULL = "full"
+DOWNSCALED = "downscaled"
+ROI = "roi"
+CACHED = "cached"
+TIERS = (FULL, DOWNSCALED, ROI)
+
+
+class DeadlinePlanner:
+    """
+    Picks the best processing tier that is expected to finish within a request's time budget.
+
+    - full: OCR of the whole page at full resolution.
+    - downscaled: OCR of the whole page resized by `downscale`.
+    - roi: checkbox detection first, then OCR restricted to the neighbourhood of the selected checkboxes.
+
+    Cost is modelled per tier as seconds per megapixel of page, learned as an exponential moving average
+    of that tier's observed latencies only. Detection and association take about the same time whatever
+    the tier, so a rate shared across tiers would be pushed up by the cheap tiers' samples and send later
+    requests to cheap tiers for good. Until a tier has been observed, its rate is the full page rate
+    scaled by the share of the page it OCRs: `downscale` squared, or `roi_fraction`.
+    """
+
+    def __init__(self, downscale=0.5, roi_fraction=0.2, initial_rate=1.0, alpha=0.2):
+        self.downscale = downscale
+        self.roi_fraction = roi_fraction
+        self.initial_rate = initial_rate
+        self.alpha = alpha
+        # Learned seconds per page megapixel of each tier, None until the tier has been observed
+        self.rates = {tier: None for tier in TIERS}
+
+    def work_fraction(self, tier):
+        """Share of the page's pixels the tier OCRs, as assumed before the tier is observed."""
+        if tier == DOWNSCALED:
+            return self.downscale ** 2
+        if tier == ROI:
+            return self.roi_fraction
+        return 1.0
+
+    def rate(self, tier):
+        if self.rates[tier] is not None:
+            return self.rates[tier]
+        # The roi tier's rate is mostly fixed costs, it says little about whole-page OCR
+        if self.rates[FULL] is not None:
+            full_rate = self.rates[FULL]
+        elif self.rates[DOWNSCALED] is not None:
+            full_rate = self.rates[DOWNSCALED] / self.work_fraction(DOWNSCALED)
+        else:
+            full_rate = self.initial_rate
+        return full_rate * self.work_fraction(tier)
+
+    def estimate(self, tier, megapixels):
+        """Expected seconds to process a page of `megapixels` in the given tier."""
+        return self.rate(tier) * megapixels
+
+    def choose(self, megapixels, budget):
+        """Returns the first tier expected to fit in `budget` seconds, or the cheapest one if none does."""
+        if budget is None:
+            return FULL
+        for tier in TIERS:
+            if self.estimate(tier, megapixels) <= budget:
+                return tier
+        return TIERS[-1]
+
+    def record(self, tier, megapixels, seconds):
+        """Feeds back the latency of a request processed in `tier` and the size of its page."""
+        if tier not in self.rates or megapixels <= 0:
+            return
+        rate = seconds / megapixels
+        if self.rates[tier] is None:
+            self.rates[tier] = rate
+        else:
+            self.rates[tier] += self.alpha * (rate - self.rates[tier])
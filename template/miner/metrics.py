@@ -0,0 +1,161 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import bittensor as bt
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Latency distribution over a sliding window of the most recent observations, plus all-time count and sum."""
+
+    def __init__(self, window=1024):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        values = sorted(self.values)
+        if not values:
+            return 0.0
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class MinerMetrics:
+    """
+    Per-stage latencies, counters and gauges of the miner, rendered in the Prometheus text format.
+
+    Stage latencies are aggregated per stage. Every span is also logged at trace level together with
+    its request id, which keeps the exported series bounded while still allowing one request to be
+    followed through the logs.
+    """
+
+    def __init__(self, window=1024, prefix="miner"):
+        self.window = window
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, request_id=None):
+        """`with metrics.span("ocr", request_id):` records how long the block took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(stage, elapsed)
+            bt.logging.trace(f"[{request_id}] {stage} took {elapsed * 1000:.1f} ms")
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.window)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value_fn):
+        """Registers a gauge whose value is read from `value_fn()` each time the metrics are rendered."""
+        self.gauges[name] = value_fn
+
+    def render(self):
+        lines = []
+        latency = f"{self.prefix}_stage_latency_seconds"
+        lines.append(f"# TYPE {latency} summary")
+        with self._lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for q in QUANTILES:
+                    lines.append(f'{latency}{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q):.6f}')
+                lines.append(f'{latency}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{latency}_count{{stage="{stage}"}} {histogram.count}')
+
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"{self.prefix}_{name}_total"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+
+        for name, value_fn in sorted(self.gauges.items()):
+            try:
+                value = float(value_fn())
+            except Exception as e:
+                bt.logging.debug(f"Could not read gauge {name}: {e}")
+                continue
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            lines.append(f"{self.prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """
+    Serves `metrics.render()` on http://<host>:<port>/metrics from a daemon thread.
+    Port 0 binds a free port. Raises OSError if the port is taken.
+    """
+
+    def __init__(self, metrics, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.server.metrics = metrics
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        bt.logging.info(f"Serving miner metrics on http://{host}:{port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
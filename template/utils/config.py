@@ -151,6 +151,350 @@ def add_miner_args(cls, parser):
         default=False,
     )
 
+    parser.add_argument(
+        "--neuron.num_workers",
+        type=int,
+        help="Number of worker threads used to run OCR and checkbox detection off the event loop.",
+        default=4,
+    )
+
+    parser.add_argument(
+        "--detector.backend",
+        type=str,
+        choices=["http", "onnx"],
+        help="Checkbox detection backend: the external YOLO service (http) or an in-process ONNX Runtime session (onnx).",
+        default="http",
+    )
+
+    parser.add_argument(
+        "--detector.model_path",
+        type=str,
+        help="Path to the YOLO checkbox model exported to ONNX, used by the onnx backend.",
+        default="",
+    )
+
+    parser.add_argument(
+        "--detector.intra_op_threads",
+        type=int,
+        help="ONNX Runtime threads used inside an operator. 0 lets ONNX Runtime decide.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--detector.inter_op_threads",
+        type=int,
+        help="ONNX Runtime threads used to run independent operators in parallel. 0 lets ONNX Runtime decide.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--detector.input_size",
+        type=int,
+        help="Input resolution of the ONNX model, when the export doesn't fix it.",
+        default=640,
+    )
+
+    parser.add_argument(
+        "--detector.conf_threshold",
+        type=float,
+        help="Minimum confidence of a detection returned by the onnx backend.",
+        default=0.25,
+    )
+
+    parser.add_argument(
+        "--detector.iou_threshold",
+        type=float,
+        help="IoU above which overlapping detections of the onnx backend are suppressed.",
+        default=0.45,
+    )
+
+    parser.add_argument(
+        "--detector.class_names",
+        type=str,
+        help="Comma separated checkbox states in the class order of the ONNX model.",
+        default="unselected,selected",
+    )
+
+    parser.add_argument(
+        "--yolo.endpoint",
+        type=str,
+        help="URL of the YOLO checkbox detection service.",
+        default="http://127.0.0.1:5000/predict",
+    )
+
+    parser.add_argument(
+        "--yolo.timeout",
+        type=float,
+        help="Deadline in seconds for a YOLO request, retries included.",
+        default=10.0,
+    )
+
+    parser.add_argument(
+        "--yolo.max_retries",
+        type=int,
+        help="How many times a failed YOLO request is retried.",
+        default=2,
+    )
+
+    parser.add_argument(
+        "--yolo.pool_size",
+        type=int,
+        help="Maximum number of pooled keep-alive connections to the YOLO service.",
+        default=16,
+    )
+
+    parser.add_argument(
+        "--yolo.keepalive_timeout",
+        type=float,
+        help="Seconds an idle connection to the YOLO service is kept open.",
+        default=60.0,
+    )
+
+    parser.add_argument(
+        "--yolo.batch_endpoint",
+        type=str,
+        help="Optional URL of a batched predict endpoint of the YOLO service. Without it, batches are sent as concurrent single requests.",
+        default="",
+    )
+
+    parser.add_argument(
+        "--batching.window_ms",
+        type=float,
+        help="Milliseconds to collect concurrent images into one detection batch. 0 disables micro-batching.",
+        default=0.0,
+    )
+
+    parser.add_argument(
+        "--batching.max_batch_size",
+        type=int,
+        help="Maximum number of images in one detection batch.",
+        default=8,
+    )
+
+    parser.add_argument(
+        "--ocr.num_workers",
+        type=int,
+        help="Number of long-lived Tesseract worker processes.",
+        default=2,
+    )
+
+    parser.add_argument(
+        "--ocr.max_queue",
+        type=int,
+        help="Maximum number of images waiting for a free Tesseract worker.",
+        default=16,
+    )
+
+    parser.add_argument(
+        "--ocr.queue_timeout",
+        type=float,
+        help="Seconds a request waits for room in the OCR queue before it is dropped.",
+        default=30.0,
+    )
+
+    parser.add_argument(
+        "--ocr.preprocess",
+        type=str,
+        choices=["none", "gray", "fast", "fastest"],
+        help="Image preprocessing profile applied before full-page OCR, see neurons/preprocess.py. "
+        "Compare them with `python neurons/benchmark.py preprocess`.",
+        default="none",
+    )
+
+    parser.add_argument(
+        "--ocr.config_file",
+        type=str,
+        help="JSON Tesseract configuration (psm, oem, variables) written by `python neurons/benchmark.py tesseract`. "
+        "Empty uses Tesseract's defaults.",
+        default="",
+    )
+
+    parser.add_argument(
+        "--ocr.tile_megapixels",
+        type=float,
+        help="Pages larger than this are split into overlapping horizontal bands OCR'd in parallel, "
+        "one per OCR worker. 0 disables tiling.",
+        default=6.0,
+    )
+
+    parser.add_argument(
+        "--ocr.tile_overlap",
+        type=int,
+        help="Pixels each OCR band extends past its cut, should exceed the height of a text line.",
+        default=40,
+    )
+
+    parser.add_argument(
+        "--ocr.lang",
+        type=str,
+        help="Tesseract language(s) loaded by the OCR workers.",
+        default="eng",
+    )
+
+    parser.add_argument(
+        "--admission.max_inflight",
+        type=int,
+        help="Maximum number of documents the miner processes at the same time.",
+        default=4,
+    )
+
+    parser.add_argument(
+        "--admission.max_queue",
+        type=int,
+        help="Maximum number of requests waiting for a processing slot before new ones are rejected.",
+        default=32,
+    )
+
+    parser.add_argument(
+        "--cache.off",
+        action="store_true",
+        help="Disable the miner result cache.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--cache.max_entries",
+        type=int,
+        help="Maximum number of entries in the result cache.",
+        default=1024,
+    )
+
+    parser.add_argument(
+        "--cache.max_bytes",
+        type=int,
+        help="Maximum size in bytes of the serialized entries held by the result cache.",
+        default=64 * 1024 * 1024,
+    )
+
+    parser.add_argument(
+        "--cache.ttl",
+        type=float,
+        help="Seconds a cached result stays valid.",
+        default=24 * 3600,
+    )
+
+    parser.add_argument(
+        "--cache.persist",
+        action="store_true",
+        help="If set, cached results are written to disk under the neuron directory and reloaded on restart.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--cache.intermediates",
+        action="store_true",
+        help="If set, OCR and YOLO results are cached too, not only the final checkbox output.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--pipeline.order",
+        type=str,
+        choices=["parallel", "detect_first"],
+        help="parallel runs full-page OCR alongside detection and answers without waiting for it when no checkbox "
+        "is selected. detect_first runs detection, skips OCR when no confidently selected checkbox is found and "
+        "otherwise OCRs only the regions around the selected checkboxes.",
+        default="parallel",
+    )
+
+    parser.add_argument(
+        "--pipeline.roi_label_width",
+        type=int,
+        help="Width in pixels of the OCR region right of a selected checkbox in detect_first mode. 0 reaches the page edge.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--association.engine",
+        type=str,
+        choices=["loop", "matrix", "columns"],
+        help="How selected checkboxes are matched to OCR lines: per checkbox through the line index (loop), "
+        "all at once with numpy (matrix), or with the label side, left or right, decided per column of "
+        "checkboxes (columns).",
+        default="loop",
+    )
+
+    parser.add_argument(
+        "--association.nms_threshold",
+        type=float,
+        help="Detections overlapping a more confident one by more than this are treated as duplicates of the "
+        "same checkbox and dropped before association. 0 keeps every detection.",
+        default=0.5,
+    )
+
+    parser.add_argument(
+        "--association.nms_method",
+        type=str,
+        choices=["min", "max"],
+        help="Overlap measure of duplicate suppression: intersection over the smaller (min) or larger (max) box.",
+        default="min",
+    )
+
+    parser.add_argument(
+        "--association.multiline",
+        action="store_true",
+        help="Append to a label the lines it wraps onto: aligned with its start, just below it and not "
+        "next to another checkbox.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--deadline.off",
+        action="store_true",
+        help="Always process at full resolution, whatever the time budget of the request.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--deadline.margin",
+        type=float,
+        help="Seconds of the request timeout kept in reserve for the response to travel back.",
+        default=1.0,
+    )
+
+    parser.add_argument(
+        "--deadline.downscale",
+        type=float,
+        help="Resize factor applied to the page by the downscaled processing tier.",
+        default=0.5,
+    )
+
+    parser.add_argument(
+        "--warmup.iterations",
+        type=int,
+        help="How many times the warm-up images are run through the pipeline before the axon starts. 0 disables warm-up.",
+        default=2,
+    )
+
+    parser.add_argument(
+        "--warmup.images_dir",
+        type=str,
+        help="Directory of .jpg images used for warm-up. Defaults to the bundled test_images.",
+        default="",
+    )
+
+    parser.add_argument(
+        "--metrics.off",
+        action="store_true",
+        help="Disable the local Prometheus metrics endpoint of the miner.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--metrics.host",
+        type=str,
+        help="Interface the metrics endpoint listens on.",
+        default="127.0.0.1",
+    )
+
+    parser.add_argument(
+        "--metrics.port",
+        type=int,
+        help="Port of the local Prometheus metrics endpoint, served at /metrics. 0 (the default) serves no "
+        "endpoint; give each miner on a host its own port.",
+        default=0,
+    )
+
     parser.add_argument(
         "--wandb.project_name",
         type=str,
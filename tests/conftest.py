@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The neurons run as scripts and import each other as top-level modules (`from document import OcrDocument`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "neurons"))
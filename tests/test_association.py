@@ -0,0 +1,200 @@
+import copy
+import random
+
+from document import OcrDocument
+from geometry import polygons_to_xyxy
+from postprocessor import AssociationContext, YoloCheckboxDetector
+
+
+def box(x, y, width=20, height=20):
+    return [x, y, x + width, y, x + width, y + height, x, y + height]
+
+
+def checkbox(x, y, state="selected", confidence=0.9):
+    return {"state": state, "confidence": confidence, "boundingBox": box(x, y)}
+
+
+def document_from_lines(lines, width=1000, height=1000):
+    """OcrDocument with one line per (text, left, top, width) tuple, its words spread evenly over the width."""
+    ocr_data = {key: [] for key in ("text", "left", "top", "width", "height", "block_num", "par_num", "line_num")}
+    for line_num, (text, left, top, line_width) in enumerate(lines):
+        words = text.split()
+        word_width = line_width // len(words)
+        for i, word in enumerate(words):
+            values = (word, left + i * word_width, top, word_width - 4, 20, 1, 1, line_num + 1)
+            for key, value in zip(ocr_data, values):
+                ocr_data[key].append(value)
+    return OcrDocument.from_ocr_data(ocr_data, width, height)
+
+
+# A two-column form, with a line running under a checkbox (stripped) and a stray mark read as "X"
+FORM_LINES = [
+    ("Full time", 40, 100, 100),
+    ("Part time", 440, 100, 100),
+    ("Contract", 40, 140, 90),
+    ("Other: see notes below", 400, 178, 240),
+    ("X Intern", 40, 220, 110),
+]
+FORM_CHECKBOXES = [checkbox(12, 100), checkbox(412, 102), checkbox(10, 142, state="unselected"),
+                   checkbox(412, 180), checkbox(12, 218)]
+
+
+def random_page(seed, num_lines=120, num_checkboxes=60):
+    rng = random.Random(seed)
+    lines = [
+        (" ".join("w" * rng.randint(1, 8) for _ in range(rng.randint(1, 4))),
+         rng.randrange(0, 900), rng.randrange(0, 1900), rng.randint(30, 300))
+        for _ in range(num_lines)
+    ]
+    checkboxes = [checkbox(rng.randrange(0, 900), rng.randrange(0, 1900)) for _ in range(num_checkboxes)]
+    return document_from_lines(lines, 1200, 2000), checkboxes
+
+
+def associate(document, checkboxes, **kwargs):
+    return YoloCheckboxDetector().get_associated_text(AssociationContext(document), copy.deepcopy(checkboxes), **kwargs)
+
+
+def test_index_matches_full_scan_on_a_form():
+    document = document_from_lines(FORM_LINES)
+    selected = YoloCheckboxDetector().get_selected_checkboxes(FORM_CHECKBOXES)
+
+    indexed = associate(document, selected)
+    assert indexed == associate(document, selected, use_index=False)
+    # the line under a checkbox loses its left part by character ratio, and the "X" mark is dropped
+    assert [result["text"] for result in indexed] == ["Full time", "Part time", "ther: see notes below", " Intern"]
+    assert indexed[0]["checkbox_boundingBox"] == box(12, 100)
+
+
+def test_index_matches_full_scan_on_random_pages():
+    for seed in range(20):
+        document, checkboxes = random_page(seed)
+        assert associate(document, checkboxes) == associate(document, checkboxes, use_index=False), seed
+
+
+def associate_without_carry_over(document, checkboxes):
+    """The loop with a fresh context per checkbox, so no line is stripped for one checkbox and reused narrowed."""
+    detector = YoloCheckboxDetector()
+    results = []
+    for checkbox in copy.deepcopy(checkboxes):
+        results.extend(detector.get_associated_text(AssociationContext(document), [checkbox]))
+    return results
+
+
+def test_matrix_matches_loop_without_carry_over():
+    detector = YoloCheckboxDetector()
+    document = document_from_lines(FORM_LINES)
+    selected = detector.get_selected_checkboxes(FORM_CHECKBOXES)
+    matrix = detector.get_associated_text_matrix(AssociationContext(document), copy.deepcopy(selected))
+    assert matrix == associate_without_carry_over(document, selected) == associate(document, selected)
+
+    for seed in range(20):
+        document, checkboxes = random_page(seed)
+        matrix = detector.get_associated_text_matrix(AssociationContext(document), copy.deepcopy(checkboxes))
+        assert matrix == associate_without_carry_over(document, checkboxes), seed
+
+
+def test_engine_switch_and_carry_over():
+    # Two checkboxes over the same long line: the loop narrows it for the first one and the second
+    # sees the narrowed box, the matrix engine strips the full line for each
+    document = document_from_lines([("one two three four five six", 40, 100, 600)])
+    checkboxes = [checkbox(200, 100), checkbox(400, 100)]
+
+    loop = YoloCheckboxDetector("loop").get_selected_checkboxes_with_text(copy.deepcopy(checkboxes), document, "t")
+    matrix = YoloCheckboxDetector("matrix").get_selected_checkboxes_with_text(copy.deepcopy(checkboxes), document, "t")
+    assert matrix == associate_without_carry_over(document, checkboxes)
+    assert [result["boundingBox"][0] for result in matrix] == [200, 400]
+    assert loop[0]["text"] == matrix[0]["text"] and loop[1]["text"] != matrix[1]["text"]
+
+
+def columns(document, checkboxes):
+    return YoloCheckboxDetector("columns").get_selected_checkboxes_with_text(copy.deepcopy(checkboxes), document, "t")
+
+
+def test_columns_engine_reads_left_labels():
+    # "Married [x]" / "Single [ ]" / "Widowed [x]", labels ending 5 px before their checkbox
+    document = document_from_lines([("Married", 100, 100, 80), ("Single", 110, 140, 70), ("Widowed X", 100, 180, 80)])
+    checkboxes = [checkbox(185, 100), checkbox(185, 140, state="unselected"), checkbox(185, 180)]
+
+    results = columns(document, checkboxes)
+    assert [(result["text"], result["boundingBox"][0]) for result in results] == [("Married", 100), ("Widowed", 100)]
+    # the right-side loop finds nothing there
+    assert YoloCheckboxDetector("loop").get_selected_checkboxes_with_text(copy.deepcopy(checkboxes), document, "t") == []
+
+
+def test_columns_engine_decides_the_side_per_column():
+    # left column: "[x] Yes" labels on the right; right column: "Red [x]" labels on the left
+    document = document_from_lines([
+        ("Yes", 45, 100, 60), ("No", 45, 140, 60),
+        ("Red", 400, 100, 70), ("Blue", 400, 140, 70),
+    ])
+    checkboxes = [checkbox(20, 100), checkbox(20, 140, state="unselected"),
+                  checkbox(475, 100, state="unselected"), checkbox(475, 140)]
+
+    detector = YoloCheckboxDetector("columns")
+    context = AssociationContext(document, "t", polygons_to_xyxy([c["boundingBox"] for c in checkboxes]))
+    column_starts, at_left = detector.get_label_sides(context, context.checkbox_boxes)
+    assert column_starts.tolist() == [30, 485] and at_left == [False, True]
+    assert [result["text"] for result in columns(document, checkboxes)] == ["Yes", "Blue"]
+
+
+def test_columns_engine_prefers_the_right_side_on_ties():
+    # a label 5 px away on each side of the checkbox (words end 4 px short of their share of the line)
+    document = document_from_lines([("Before", 99, 100, 80), ("After", 205, 100, 80)])
+    checkboxes = [checkbox(180, 100)]
+    assert YoloCheckboxDetector().label_gaps(AssociationContext(document), [180, 100, 200, 120]) == (5, 5)
+    assert [result["text"] for result in columns(document, checkboxes)] == ["After"]
+
+    # unselected checkboxes of the same column with clear left labels outvote the tie
+    document = document_from_lines([("Before", 99, 100, 80), ("After", 205, 100, 80), ("Other", 120, 140, 60)])
+    checkboxes.append(checkbox(185, 140, state="unselected"))
+    assert [result["text"] for result in columns(document, checkboxes)] == ["Before"]
+
+
+def multiline(document, checkboxes, engine="loop"):
+    detector = YoloCheckboxDetector(engine, multiline=True)
+    return [
+        (result["text"], result["boundingBox"])
+        for result in detector.get_selected_checkboxes_with_text(copy.deepcopy(checkboxes), document, "t")
+    ]
+
+
+def test_multiline_merges_wrapped_labels():
+    document = document_from_lines([("Yes, I agree", 40, 100, 120), ("to the terms", 42, 124, 120), ("Thanks", 40, 300, 60)])
+    checkboxes = [checkbox(12, 100)]
+    assert multiline(document, checkboxes) == [("Yes, I agree to the terms", [40, 100, 158, 100, 158, 144, 40, 144])]
+    # off by default
+    assert associate(document, checkboxes)[0]["text"] == "Yes, I agree"
+
+
+def test_multiline_stops_at_another_checkbox_label():
+    # the second line starts the label of the next checkbox, selected or not
+    document = document_from_lines([("Yes, I agree", 40, 100, 120), ("No", 40, 124, 40)])
+    for state in ("selected", "unselected"):
+        checkboxes = [checkbox(12, 100), checkbox(12, 124, state=state)]
+        assert multiline(document, checkboxes)[0][0] == "Yes, I agree"
+
+
+def test_multiline_caps_labels_and_requires_alignment():
+    lines = [("line one", 40, 100, 100), ("line two", 40, 124, 100), ("line three", 40, 148, 100), ("line four", 40, 172, 100)]
+    assert YoloCheckboxDetector.MAX_LABEL_LINES == 3
+    assert multiline(document_from_lines(lines), [checkbox(12, 100)])[0][0] == "line one line two line three"
+
+    tolerance = YoloCheckboxDetector.CONTINUATION_X_TOLERANCE
+    for offset, expected in ((tolerance, "line one line two"), (tolerance + 1, "line one")):
+        document = document_from_lines([lines[0], ("line two", 40 + offset, 124, 100)])
+        assert multiline(document, [checkbox(12, 100)])[0][0] == expected
+    # nor does a line beyond the gap continue the label
+    document = document_from_lines([lines[0], ("line two", 40, 145, 100)])
+    assert multiline(document, [checkbox(12, 100)])[0][0] == "line one"
+
+
+def test_multiline_matrix_matches_loop_without_carry_over():
+    detector = YoloCheckboxDetector(multiline=True)
+    for seed in range(20):
+        document, checkboxes = random_page(seed)
+        boxes = polygons_to_xyxy([result["boundingBox"] for result in checkboxes])
+        matrix = detector.get_associated_text_matrix(AssociationContext(document, "", boxes), copy.deepcopy(checkboxes))
+        loop = []
+        for result in copy.deepcopy(checkboxes):
+            loop.extend(detector.get_associated_text(AssociationContext(document, "", boxes), [result]))
+        assert matrix == loop, seed
@@ -0,0 +1,66 @@
+import numpy as np
+
+from document import OcrDocument
+
+
+def ocr_data(words, line_ids=True):
+    """`image_to_data`-like dict from (text, left, top, width, height, block, par, line) tuples."""
+    keys = ("text", "left", "top", "width", "height", "block_num", "par_num", "line_num")
+    data = {key: [word[i] for word in words] for i, key in enumerate(keys)}
+    if not line_ids:
+        for key in keys[5:]:
+            del data[key]
+    return data
+
+
+WORDS = [
+    ("Yes,", 40, 100, 40, 20, 1, 1, 1),
+    ("I", 90, 101, 10, 20, 1, 1, 1),
+    ("", 105, 100, 0, 0, 1, 1, 1),
+    ("agree", 105, 100, 50, 20, 1, 1, 1),
+    # same Tesseract line, but past the gap threshold: another column of the form
+    ("No", 400, 100, 30, 20, 1, 1, 1),
+    ("Terms", 40, 140, 60, 20, 1, 1, 2),
+]
+
+
+def test_from_ocr_data_groups_by_line_ids_and_gaps():
+    document = OcrDocument.from_ocr_data(ocr_data(WORDS), 500, 300)
+
+    assert document.line_texts() == ["Yes, I agree", "No", "Terms"]
+    assert [document.line_text(i) for i in range(len(document))] == document.line_texts()
+    assert document.line_boxes.tolist() == [[40, 100, 155, 121], [400, 100, 430, 120], [40, 140, 100, 160]]
+    assert document.line_polygons()[0].tolist() == [40, 100, 155, 100, 155, 121, 40, 121]
+    assert document.word_boxes.dtype == np.int32 and len(document.word_boxes) == 5
+
+
+def test_from_ocr_data_follows_tesseract_lines_over_proximity():
+    # Words of two Tesseract lines that touch, e.g. a label and the value printed right after it.
+    # The old proximity grouping merged them into one line, the line ids keep them apart.
+    words = [("Name:", 40, 100, 60, 20, 1, 1, 1), ("Smith", 110, 104, 60, 20, 2, 1, 1)]
+    assert OcrDocument.from_ocr_data(ocr_data(words), 500, 300).line_texts() == ["Name:", "Smith"]
+    # while a word lifted by more than the old y threshold stays on its Tesseract line
+    words = [("x", 40, 100, 20, 20, 1, 1, 1), ("2", 62, 84, 8, 10, 1, 1, 1)]
+    assert OcrDocument.from_ocr_data(ocr_data(words), 500, 300).line_texts() == ["x 2"]
+
+
+def test_from_ocr_data_without_line_ids_chains_by_proximity():
+    document = OcrDocument.from_ocr_data(ocr_data(WORDS, line_ids=False), 500, 300)
+    assert document.line_texts() == ["Yes, I agree", "No", "Terms"]
+
+
+def test_empty_and_round_trips():
+    assert len(OcrDocument.from_ocr_data(ocr_data([("  ", 0, 0, 5, 5, 1, 1, 1)]), 10, 10)) == 0
+    assert OcrDocument.empty().line_texts() == []
+
+    document = OcrDocument.from_ocr_data(ocr_data(WORDS), 500, 300)
+    for copy in (OcrDocument.from_compact(document.to_compact()), OcrDocument.from_dict(document.to_dict())):
+        assert copy.line_texts() == document.line_texts()
+        assert np.array_equal(copy.line_boxes, document.line_boxes)
+        assert np.array_equal(copy.word_boxes, document.word_boxes)
+
+
+def test_line_index_returns_lines_in_document_order():
+    document = OcrDocument.from_ocr_data(ocr_data(WORDS), 500, 300)
+    assert document.line_index.lines_starting_between(90, 130).tolist() == [0, 1]
+    assert document.line_index.lines_starting_between(100, 140).tolist() == []
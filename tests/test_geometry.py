@@ -0,0 +1,61 @@
+import random
+
+import numpy as np
+import pytest
+
+from geometry import overlap_matrix, non_max_suppression, polygons_to_xyxy
+from postprocessor import YoloCheckboxDetector
+
+
+def box(x, y, width=20, height=20):
+    return [x, y, x + width, y, x + width, y + height, x, y + height]
+
+
+def random_boxes(rng, count):
+    boxes = [box(rng.randrange(0, 200), rng.randrange(0, 200), rng.randint(0, 60), rng.randint(0, 60)) for _ in range(count)]
+    # and a few identical and nested ones
+    return boxes + [boxes[0], box(boxes[1][0] + 2, boxes[1][1] + 2, 5, 5)]
+
+
+@pytest.mark.parametrize("method", ["min", "max"])
+def test_overlap_matrix_matches_is_overlapping(method):
+    detector = YoloCheckboxDetector()
+    rng = random.Random(0)
+    boxes = random_boxes(rng, 40)
+    matrix = overlap_matrix(polygons_to_xyxy(boxes), polygons_to_xyxy(boxes), method)
+    expected = [[detector.isOverlapping(a, b, method) for b in boxes] for a in boxes]
+    np.testing.assert_allclose(matrix, expected)
+
+
+def test_overlap_matrix_iou():
+    matrix = overlap_matrix([[0, 0, 10, 10]], [[5, 0, 15, 10], [0, 0, 0, 0], [20, 20, 30, 30]])
+    np.testing.assert_allclose(matrix, [[50 / 150, 0.0, 0.0]])
+    with pytest.raises(ValueError):
+        overlap_matrix([[0, 0, 1, 1]], [[0, 0, 1, 1]], "area")
+
+
+def test_non_max_suppression_keeps_best_of_each_group():
+    boxes = [[0, 0, 10, 10], [1, 1, 11, 11], [100, 100, 110, 110], [2, 0, 12, 10], [101, 100, 111, 110]]
+    scores = [0.5, 0.9, 0.4, 0.3, 0.8]
+    assert non_max_suppression(boxes, scores, 0.5).tolist() == [1, 4]
+    assert non_max_suppression(boxes, scores, 1.0).tolist() == [1, 4, 0, 2, 3]
+    assert non_max_suppression(np.empty((0, 4)), [], 0.5).tolist() == []
+
+
+def test_suppress_duplicate_checkboxes():
+    predictions = [
+        {"state": "unselected", "confidence": 0.6, "boundingBox": box(10, 10)},
+        {"state": "selected", "confidence": 0.95, "polygon": box(11, 11)},
+        {"state": "selected", "confidence": 0.7, "boundingBox": box(300, 10)},
+        # a small box inside a large one: min overlap 1, max overlap 0.0625
+        {"state": "selected", "confidence": 0.8, "boundingBox": box(500, 10, 40, 40)},
+        {"state": "unselected", "confidence": 0.5, "boundingBox": box(505, 15, 10, 10)},
+    ]
+    kept = YoloCheckboxDetector().suppress_duplicate_checkboxes(predictions)
+    # the most confident detection of each checkbox wins whatever its state, in the original order
+    assert kept == [predictions[1], predictions[2], predictions[3]]
+
+    kept = YoloCheckboxDetector(nms_method="max").suppress_duplicate_checkboxes(predictions)
+    assert kept == [predictions[1], predictions[2], predictions[3], predictions[4]]
+
+    assert YoloCheckboxDetector(nms_threshold=0).suppress_duplicate_checkboxes(predictions) is predictions
@@ -0,0 +1,49 @@
+import base64
+import hashlib
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from image import ImageDecodeError, decode_image, MAXIMUM_ACCEPTABLE_SIZE, REDUCED_IMAGE_SIZE
+
+
+def encode(width, height, format="PNG"):
+    buffer = BytesIO()
+    Image.new("L", (width, height), 255).save(buffer, format=format)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def test_decode_keeps_the_incoming_payload():
+    encoded = encode(120, 80, "JPEG")
+    image = decode_image(encoded)
+    assert (image.width, image.height) == (120, 80)
+    assert image.encoded is encoded
+    assert image.digest == hashlib.blake2b(base64.b64decode(encoded), digest_size=16).hexdigest()
+
+
+@pytest.mark.parametrize("encoded", [
+    "not base64!",
+    base64.b64encode(b"%PDF-1.4 not an image").decode("utf-8"),
+    encode(49, 200),
+    encode(200, 49),
+])
+def test_unusable_payloads_are_rejected(encoded):
+    with pytest.raises(ImageDecodeError):
+        decode_image(encoded)
+
+
+def test_oversized_images_are_downscaled_but_keep_their_digest():
+    encoded = encode(MAXIMUM_ACCEPTABLE_SIZE + 10, 100)
+    image = decode_image(encoded)
+    assert image.width == REDUCED_IMAGE_SIZE and image.height == 99
+    # the detector gets the downscaled image, the cache the original's digest
+    assert Image.open(BytesIO(base64.b64decode(image.encoded))).size == (image.width, image.height)
+    assert image.digest == hashlib.blake2b(base64.b64decode(encoded), digest_size=16).hexdigest()
+
+
+def test_decompression_bombs_are_rejected(monkeypatch):
+    # PIL refuses images of more than twice MAX_IMAGE_PIXELS, checked from the header before decoding
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ImageDecodeError):
+        decode_image(encode(100, 100))
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from template.miner.admission import AdmissionQueue, AdmissionRejected
+from template.miner.batching import MicroBatcher
+from template.miner.deadline import DeadlinePlanner
+from template.miner.singleflight import SingleFlight
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return [{"text": value}]
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("same-image", work, "Yes") for _ in range(5)])
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert calls == ["Yes"]
+    assert flight.executions == 1 and flight.coalesced == 4
+    assert all(result == [{"text": "Yes"}] for result in results)
+    # every caller owns its copy
+    results[0][0]["text"] = "No"
+    assert results[1][0]["text"] == "Yes"
+    assert len(flight) == 0
+
+
+def test_singleflight_propagates_errors_and_forgets_key():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("ocr failed")
+
+    async def ok():
+        return 1
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert await flight.do("k", ok) == 1
+
+    asyncio.run(main())
+
+
+def test_singleflight_followers_outlive_a_cancelled_leader():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert len(flight) == 0
+
+    asyncio.run(main())
+    # the follower ran the work again once the leader was gone
+    assert calls == [1, 1]
+
+
+def test_admission_queue_serves_by_priority():
+    order = []
+
+    async def job(queue, name, priority):
+        async with queue.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        queue = AdmissionQueue(max_inflight=1, max_queue=8)
+        first = asyncio.create_task(job(queue, "first", 0.0))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(job(queue, name, stake)) for name, stake in [("low", 1.0), ("high", 9.0), ("mid", 5.0)]]
+        await asyncio.sleep(0)
+        assert queue.depth == 3
+        await asyncio.gather(first, *tasks)
+        assert queue.inflight == 0 and queue.admitted == 4
+
+    asyncio.run(main())
+    assert order == ["first", "high", "mid", "low"]
+
+
+def test_admission_queue_rejects_when_full_or_too_slow():
+    async def hold(queue, event):
+        async with queue.slot():
+            await event.wait()
+
+    async def main():
+        queue = AdmissionQueue(max_inflight=1, max_queue=1, initial_service_time=1.0)
+        event = asyncio.Event()
+        holder = asyncio.create_task(hold(queue, event))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await queue.acquire(timeout=1.5)
+        waiter = asyncio.create_task(queue.acquire(timeout=10))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await queue.acquire()
+        assert queue.rejected_deadline == 1 and queue.rejected_full == 1
+        event.set()
+        await holder
+        await waiter
+        queue.release()
+        assert queue.inflight == 0
+
+    asyncio.run(main())
+
+
+def test_micro_batcher_groups_concurrent_items():
+    batches = []
+
+    async def double(items):
+        batches.append(list(items))
+        return [ValueError("odd") if item % 2 else item * 2 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(double, max_batch_size=3, max_wait=0.01)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(5)], return_exceptions=True)
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert batches == [[0, 1, 2], [3, 4]]
+    assert results[0] == 0 and results[2] == 4 and results[4] == 8
+    assert isinstance(results[1], ValueError) and isinstance(results[3], ValueError)
+    assert batcher.mean_batch_size == 2.5
+
+
+def test_deadline_planner_degrades_as_budget_shrinks():
+    planner = DeadlinePlanner(downscale=0.5, roi_fraction=0.1, initial_rate=1.0)
+    # 4 megapixels: full ~4s, downscaled ~1s, roi ~0.4s
+    assert planner.choose(4.0, None) == "full"
+    assert planner.choose(4.0, 5.0) == "full"
+    assert planner.choose(4.0, 2.0) == "downscaled"
+    assert planner.choose(4.0, 0.5) == "roi"
+    assert planner.choose(4.0, 0.01) == "roi"
+
+    # a slower machine than assumed pushes the same budget to a cheaper tier
+    for _ in range(50):
+        planner.record("full", 4.0, 8.0)
+    assert planner.choose(4.0, 5.0) == "downscaled"
+
+
+def test_deadline_planner_keeps_tiers_apart():
+    planner = DeadlinePlanner(downscale=0.5, roi_fraction=0.1, initial_rate=1.0)
+    planner.record("full", 4.0, 4.0)
+    # roi runs are dominated by detection and association, ~0.5s whatever the page
+    for _ in range(50):
+        planner.record("roi", 4.0, 0.5)
+    assert planner.estimate("roi", 4.0) == pytest.approx(0.5)
+    # and leave the estimates of the other tiers alone
+    assert planner.estimate("full", 4.0) == pytest.approx(4.0)
+    assert planner.estimate("downscaled", 4.0) == pytest.approx(1.0)
+    assert planner.choose(4.0, 4.5) == "full"
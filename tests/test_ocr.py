@@ -0,0 +1,35 @@
+from PIL import Image, ImageDraw
+
+from ocr import find_band_cuts, map_ocr_data_to_page, merge_regions
+
+
+def test_band_cuts_stay_even_on_blank_rows():
+    page = Image.new("L", (400, 2000), 255)
+    ImageDraw.Draw(page).rectangle((0, 0, 10, 10), fill=0)
+    assert find_band_cuts(page, 3) == [0, 666, 1333, 2000]
+
+
+def test_band_cuts_move_between_text_lines():
+    page = Image.new("L", (400, 1200), 255)
+    draw = ImageDraw.Draw(page)
+    # text lines on rows 25-54 of every 40, so the even split at 600 falls inside one
+    # and the blank rows nearest to it are 584 and 615
+    for top in range(0, 1200, 40):
+        draw.rectangle((20, top + 25, 380, top + 54), fill=0)
+    assert find_band_cuts(page, 2) == [0, 615, 1200]
+
+
+def test_merge_regions_until_none_overlap():
+    # the third region joins the first, and only then does the union reach the second
+    regions = [(0, 0, 10, 10), (20, 0, 30, 10), (5, 5, 25, 15), (0, 100, 30, 110), (30, 100, 40, 110)]
+    merged = merge_regions(regions)
+    # regions that merely touch are kept apart
+    assert merged == [(0, 0, 30, 15), (0, 100, 30, 110), (30, 100, 40, 110)]
+    assert merge_regions(merged) == merged
+
+
+def test_map_ocr_data_to_page_scales_then_offsets():
+    ocr_data = {"text": ["word"], "left": [10], "top": [20], "width": [30], "height": [8], "conf": [90]}
+    mapped = map_ocr_data_to_page(ocr_data, 0.5, offset_x=100, offset_y=50)
+    assert (mapped["left"], mapped["top"], mapped["width"], mapped["height"]) == ([120], [90], [60], [16])
+    assert mapped["text"] == ["word"] and ocr_data["left"] == [10]
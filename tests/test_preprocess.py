@@ -0,0 +1,24 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+from preprocess import otsu_threshold, preprocess_for_ocr
+
+
+def test_otsu_threshold_separates_ink():
+    bilevel = np.array([[0, 0, 255, 255]], dtype=np.uint8)
+    assert (bilevel < otsu_threshold(bilevel)).tolist() == [[True, True, False, False]]
+    scan = np.array([[10, 30, 40, 200, 220, 250]], dtype=np.uint8)
+    assert (scan < otsu_threshold(scan)).tolist() == [[True, True, True, False, False, False]]
+
+
+def test_fastest_profile_keeps_the_text():
+    page = Image.new("RGB", (600, 400), "white")
+    draw = ImageDraw.Draw(page)
+    for top in range(100, 300, 40):
+        draw.rectangle((100, top, 500, top + 20), fill="black")
+
+    prepared = preprocess_for_ocr(page, "fastest")
+    pixels = np.asarray(prepared.image)
+    # borders cropped around the text, which is still there after binarization
+    assert prepared.offset == (90, 90)
+    assert (pixels == 0).any() and (pixels == 255).any()
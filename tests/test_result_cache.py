@@ -0,0 +1,53 @@
+import time
+
+from template.miner.cache import ResultCache
+
+
+def test_get_returns_independent_copies():
+    cache = ResultCache()
+    cache.put("a-result", [{"text": "yes", "boundingBox": [1, 2, 3, 2, 3, 4, 1, 4]}])
+
+    first = cache.get("a-result")
+    first[0]["text"] = "mutated"
+
+    assert cache.get("a-result")[0]["text"] == "yes"
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", "xxxx")
+    cache.put("b", "yyyy")
+    assert cache.get("a") is None
+    assert cache.get("b") == "yyyy"
+    assert cache.size_bytes <= 10
+
+
+def test_ttl_expiry():
+    cache = ResultCache(ttl=0.01)
+    cache.put("a", [1])
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_persistence_across_instances(tmp_path):
+    cache = ResultCache(persist_dir=str(tmp_path))
+    cache.put("digest-result", [{"text": "Male"}])
+
+    reloaded = ResultCache(persist_dir=str(tmp_path))
+    assert reloaded.get("digest-result") == [{"text": "Male"}]
+
+    expired = ResultCache(persist_dir=str(tmp_path), ttl=-1)
+    expired.put("old-result", [])
+    assert ResultCache(persist_dir=str(tmp_path)).get("old-result") is None
@@ -0,0 +1,111 @@
+from concurrent.futures import Future
+
+import numpy as np
+from PIL import Image
+
+from image import DecodedImage
+from ocr import ocr_image_regions
+from postprocessor import YoloCheckboxDetector
+
+
+class FakeEngine():
+    """
+    Stands in for TesseractPool on pages drawn by render_page: every word is a rectangle filled with its own
+    gray level, so the engine can tell which words a crop shows. A word cut by the crop edge is read as the
+    share of its letters that is visible, like Tesseract reading half a word.
+    """
+
+    def __init__(self, words):
+        self.words = words
+        self.crops = []
+
+    def submit(self, crop, psm=None, cancel_token=None):
+        self.crops.append(crop.size)
+        pixels = np.asarray(crop)
+        ocr_data = {key: [] for key in ("text", "left", "top", "width", "height", "conf", "block_num", "par_num", "line_num")}
+        for level in np.unique(pixels[pixels < 255]).tolist():
+            text, _, _, width, _ = self.words[level - 1]
+            rows, cols = np.nonzero(pixels == level)
+            x1, y1, x2, y2 = cols.min(), rows.min(), cols.max() + 1, rows.max() + 1
+            visible = round(len(text) * (x2 - x1) / width)
+            if x2 - x1 < width:
+                text = text[-visible:] if x1 == 0 else text[:visible]
+            if not text:
+                continue
+            for key, value in zip(ocr_data, (text, int(x1), int(y1), int(x2 - x1), int(y2 - y1), 90, 1, 1, int(y1) // 10)):
+                ocr_data[key].append(value)
+        future = Future()
+        future.set_result(ocr_data)
+        return future
+
+
+def render_page(words, width=800, height=600):
+    """A DecodedImage of the (text, left, top, width, height) words, word i drawn with gray level i + 1."""
+    pixels = np.full((height, width), 255, dtype=np.uint8)
+    for level, (_, left, top, word_width, word_height) in enumerate(words, start=1):
+        pixels[top:top + word_height, left:left + word_width] = level
+    return DecodedImage(b"", Image.fromarray(pixels), "page")
+
+
+def box(x, y, width=20, height=20):
+    return [x, y, x + width, y, x + width, y + height, x, y + height]
+
+
+def roi_association(detector, words, predictions, label_width=None):
+    """Runs the detect-first pipeline of Miner.postprocess on a rendered page."""
+    page = render_page(words)
+    candidates = detector.get_candidate_checkboxes(predictions)
+    regions = detector.get_text_search_regions(candidates, page.width, page.height, label_width=label_width)
+    document = ocr_image_regions(page, regions, engine=FakeEngine(words))
+    return detector.get_selected_checkboxes_with_text(predictions, document, "roi")
+
+
+def test_columns_engine_regions_reach_left_labels():
+    words = [("Left", 100, 100, 60, 20)]
+    predictions = [{"state": "selected", "confidence": 0.9, "boundingBox": box(165, 100)}]
+
+    for label_width in (None, 200):
+        results = roi_association(YoloCheckboxDetector("columns"), words, predictions, label_width)
+        assert [(result["text"], result["boundingBox"]) for result in results] == [
+            ("Left", [100, 100, 160, 100, 160, 120, 100, 120])
+        ]
+    # the right-side engines keep their narrow band, which cuts the label
+    assert roi_association(YoloCheckboxDetector("loop"), words, predictions) == []
+
+
+def test_multiline_regions_reach_wrapped_lines():
+    words = [("Yes,", 40, 100, 40, 20), ("I", 84, 100, 10, 20), ("agree", 40, 124, 50, 20), ("Other", 40, 300, 60, 20)]
+    predictions = [{"state": "selected", "confidence": 0.9, "boundingBox": box(12, 100)}]
+
+    results = roi_association(YoloCheckboxDetector(multiline=True), words, predictions)
+    assert [(result["text"], result["boundingBox"]) for result in results] == [
+        ("Yes, I agree", [40, 100, 94, 100, 94, 144, 40, 144])
+    ]
+    # without multiline the band ends just below the checkbox
+    assert [result["text"] for result in roi_association(YoloCheckboxDetector(), words, predictions)] == ["Yes, I"]
+
+
+def test_region_words_are_mapped_to_page_pixels():
+    words = [("Full", 300, 200, 40, 20), ("time", 350, 200, 40, 20), ("Part", 600, 400, 40, 20)]
+    engine = FakeEngine(words)
+    # the first two regions overlap and are read as a single crop
+    document = ocr_image_regions(render_page(words), [(250, 150, 380, 260), (330, 180, 420, 240), (580, 390, 700, 430)],
+                                 engine=engine)
+    assert engine.crops == [(170, 110), (120, 40)]
+    assert document.line_texts() == ["Full time", "Part"]
+    assert document.line_boxes.tolist() == [[300, 200, 390, 220], [600, 400, 640, 420]]
+
+
+def test_regions_only_cover_screened_candidates():
+    detector = YoloCheckboxDetector()
+    predictions = [
+        {"state": "selected", "confidence": 0.9, "boundingBox": box(100, 100)},
+        {"state": "selected", "confidence": 0.2, "boundingBox": box(100, 200)},
+        {"state": "unselected", "confidence": 0.9, "boundingBox": box(100, 300)},
+        # a duplicate of the first detection
+        {"state": "selected", "confidence": 0.8, "boundingBox": box(101, 101)},
+    ]
+    candidates = detector.get_candidate_checkboxes(predictions)
+    assert candidates == [predictions[0]] and candidates[0] is not predictions[0]
+    assert detector.get_text_search_regions(candidates, 800, 600) == [(75, 80, 800, 135)]
+    assert detector.get_candidate_checkboxes(predictions[1:3]) == []